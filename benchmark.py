@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from rpa_bot.log import log
+from sap_simulator import SimulatedApplication
+from process_sap import SapProcess
+
+main_path = Path(os.path.dirname(os.path.abspath(__file__)))
+
+COCKPIT = "wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0380"
+HEADER = f"{COCKPIT}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR"
+GRID = "wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell"
+MEGUI = "wnd[0]/usr/subSUB0:SAPLMEGUI:0013"
+PO_HEADER = f"{MEGUI}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL"
+PO_ITEMS = f"{MEGUI}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211"
+PO_ITEM_DETAIL = f"{MEGUI}/subSUB3:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1301/subSUB2:SAPLMEGUI:1303/tabsITEM_DETAIL"
+PO_TOTALS = f"{PO_HEADER}/tabpTABHDT9/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1232"
+PO_ITEM_COLUMNS = ["", "txtMEPO1211-EBELP", "ctxtMEPO1211-KNTTP", "ctxtMEPO1211-EPSTP", "txtMEPO1211-EMATN", "txtMEPO1211-TXZ01", "txtMEPO1211-MENGE",
+                   "ctxtMEPO1211-MEINS", "ctxtMEPO1211-EEIND", "ctxtMEPO1211-NAME1", "txtMEPO1211-NETPR", "ctxtMEPO1211-WAERS", "txtMEPO1211-PEINH"]
+PO_TYPES = {'Standard': 'Standard PO', 'Transport': 'Transport PO', 'EPO': 'Purchase outside EPO'}
+# cockpit item table in the column order of SAP, INVOICE_ITEM[1], PO_NUMBER[2], PO_ITEM[3], ITEM_AMOUNT[4], QUANTITY[6], PO_UNIT[7], TAX_CODE[10]
+ITEM_COLUMNS = ["", "txt/COCKPIT/SITEM_DISP-INVOICE_ITEM", "ctxt/COCKPIT/SITEM_DISP-PO_NUMBER", "ctxt/COCKPIT/SITEM_DISP-PO_ITEM",
+                "txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT", "", "txt/COCKPIT/SITEM_DISP-QUANTITY", "ctxt/COCKPIT/SITEM_DISP-PO_UNIT", "", "",
+                "ctxt/COCKPIT/SITEM_DISP-TAX_CODE"]
+
+
+# outcomes of documents which failed on the simulated GUI rather than on a business rule
+ERROR_OUTCOMES = ('error', 'not available', 'could not be found', 'not in the fixtures')
+
+
+def is_error(info):
+    return any(text in info.lower() for text in ERROR_OUTCOMES)
+
+
+def change_mode(spec):
+    # the cockpit shows a document taken over for editing as screen 0381 instead of 0380
+    return {key.replace(COCKPIT, f"{COCKPIT[:-4]}0381"): value for key, value in spec.items()}
+
+
+def amount(value):
+    return f"{value:,.2f}".replace(',', ' ').replace('.', ',').replace(' ', '.')
+
+
+def generate_corpus(documents=50, seed=1, max_lines=8, pos=20, vendors=10, ariba_share=0.3, po_types=None, error_rate=0.05, booked_share=0.3):
+    """
+    This function is used to generate cockpit documents with their POs and vendors as simulator screens.
+
+    Parameters:
+    optional: documents (int): The number of documents in the cockpit list.
+    optional: seed (int): The seed of the generator, the same seed gives the same corpus.
+    optional: max_lines (int): The highest number of lines of a PO.
+    optional: pos (int): The number of POs the documents are booked against, fewer POs mean more repetition.
+    optional: vendors (int): The number of vendors of the POs.
+    optional: ariba_share (float): The share of Ariba documents, the others come from PDF Collector.
+    optional: po_types (dict): Weight per PO type ('Standard', 'Transport', 'EPO').
+    optional: error_rate (float): The share of documents which are missing in the cockpit list or have no PO number.
+    optional: booked_share (float): The share of POs which are fully invoiced already.
+
+    Returns:
+    tuple: screens by name and a list of (document number, company code) to process.
+    """
+    rng = random.Random(seed)
+    po_types = po_types or {'Standard': 0.7, 'Transport': 0.2, 'EPO': 0.1}
+    vendor_ids = [f"AC{100000 + n}" for n in range(vendors)]
+    screens = {}
+    po_numbers = []
+    for n in range(pos):
+        po_number = str(4500010000 + n)
+        vendor = rng.choice(vendor_ids)
+        po_type = rng.choices(list(po_types), weights=list(po_types.values()))[0]
+        lines = [["", str(10 * (line + 1)), "K", "", "", f"Item {line + 1}", "1", "EA", "", "", amount(rng.randint(1, 500) * 10), "EUR", "1"]
+                 for line in range(rng.randint(1, max_lines))]
+        net = sum(float(line[10].replace('.', '').replace(',', '.')) for line in lines)
+        quantity = str(len(lines))
+        invoiced = rng.random() < booked_share
+        # ordered, delivered, still to deliver and invoiced, see get_po_totals
+        values = [amount(net), amount(net), "0,00", amount(net) if invoiced else "0,00"]
+        quantities = [quantity, quantity, "0", quantity if invoiced else "0"]
+        screens[f"po_{po_number}"] = {
+            "title": f"{PO_TYPES[po_type]} {po_number} Created by RPA", "transaction": "ME23N", "screen_number": 14, "initial": False,
+            "elements": {
+                f"{MEGUI}/subSUB0:SAPLMEGUI:0030/subSUB1:SAPLMEGUI:1105/cmbMEPO_TOPLINE-BSART": {"text": PO_TYPES[po_type]},
+                f"{MEGUI}/subSUB0:SAPLMEGUI:0030/subSUB1:SAPLMEGUI:1105/ctxtMEPO_TOPLINE-SUPERFIELD": {"text": f"{vendor} Vendor"},
+                f"{PO_HEADER}/tabpTABHDT1": {"text": "Delivery/Invoice"},
+                f"{PO_HEADER}/tabpTABHDT1/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1226/ctxtMEPO1226-WAERS": {"text": "EUR"},
+                f"{PO_HEADER}/tabpTABHDT6": {"text": "Partners"},
+                f"{PO_HEADER}/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111": {
+                    "type": "table", "visible_rows": 5, "columns": ["", "txtTPART-VTEXT", "ctxtWRF02K-GPARN"],
+                    "rows": [["", "Vendor", vendor], ["", "Invoicing Party", vendor], ["", "_______________", ""]]
+                },
+                f"{PO_HEADER}/tabpTABHDT8": {"text": "Org. Data"},
+                f"{PO_HEADER}/tabpTABHDT8/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1221/ctxtMEPO1222-BUKRS": {"text": "3B5"},
+                f"{PO_HEADER}/tabpTABHDT9": {"text": "Status"},
+                **{f"{PO_TOTALS}/ssubHEADER_CUM_1:SAPLMEGUI:1235/txtMEPO1235-VALUE0{n + 1}": {"text": value} for n, value in enumerate(values)},
+                **{f"{PO_TOTALS}/ssubHEADER_CUM_2:SAPLMEGUI:1234/txtMEPO1234-QUANTITY0{n + 1}": {"text": value} for n, value in enumerate(quantities)},
+                f"{PO_HEADER}/tabpTABHDT14": {"text": "Release strategy"},
+                f"{PO_HEADER}/tabpTABHDT14/ssubTABSTRIPCONTROL2SUB:SAPLMEDCMV:0100/cntlDCMGRIDCONTROL1/shellcont/shell": {
+                    "type": "grid", "rows": [{"ERNAM": f"BUYER{rng.randint(1, 5)}"}]
+                },
+                PO_ITEMS: {"type": "table", "visible_rows": 5, "columns": PO_ITEM_COLUMNS, "rows": lines},
+                f"{PO_ITEM_DETAIL}/tabpTABIDT8": {"text": "Invoice"},
+                f"{PO_ITEM_DETAIL}/tabpTABIDT8/ssubTABSTRIPCONTROL1SUB:SAPLMEGUI:1317/chkMEPO1317-WEBRE": {"selected": rng.random() < 0.5},
+                f"{PO_ITEM_DETAIL}/tabpTABIDT8/ssubTABSTRIPCONTROL1SUB:SAPLMEGUI:1317/ctxtMEPO1317-MWSKZ": {"text": "V1"}
+            },
+            "transitions": {"wnd[0]|sendvkey:3": "back"}
+        }
+        po_numbers.append((po_number, vendor, lines))
+
+    rows = []
+    work_list = []
+    for n in range(documents):
+        doc_number = str(5100000000 + n)
+        company_code = rng.choice(['3B5', 'V436'])
+        po_number, vendor, lines = rng.choice(po_numbers)
+        broken = rng.random() < error_rate
+        work_list.append((doc_number, company_code))
+        if broken and rng.random() < 0.5:
+            # document which was already processed by someone else
+            continue
+        ariba = rng.random() < ariba_share
+        net = sum(float(line[10].replace('.', '').replace(',', '.')) for line in lines)
+        transitions = {"wnd[0]|sendvkey:3": "back", "wnd[0]|sendvkey:12": "back"}
+        if not broken:
+            # F2 on an empty PO number field stays on the document
+            transitions[f"{HEADER}/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER|sendvkey:2"] = f"po_{po_number}"
+        screens[f"document_{len(rows)}"] = {
+            "title": "Display document", "transaction": "/COCKPIT/1", "screen_number": 380, "initial": False,
+            "elements": {
+                "wnd[0]/tbar[1]/btn[25]": {"text": "Display <-> Change"},
+                f"{HEADER}/tabpTAB1": {"text": "Basic data"},
+                f"{HEADER}/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER": {"text": "" if broken else po_number},
+                f"{HEADER}/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-SGTXT": {"text": "", "changeable": False},
+                f"{HEADER}/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/cmb/COCKPIT/SHDR_DISP-TRANSACTION": {"text": "Invoice", "key": "1"},
+                f"{HEADER}/tabpTAB2": {"text": "Header data"},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-VENDOR_NO": {"text": vendor},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-CURRENCY": {"text": "EUR"},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-COMP_CODE": {"text": company_code},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-DOC_DATE": {"text": "02.05.2021"},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-PSTNG_DATE": {"text": ""},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-REF_DOC_NO": {"text": f"INV-{doc_number}"},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-GROSS_AMOUNT": {"text": amount(net * 1.2)},
+                f"{HEADER}/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-NET_AMOUNT": {"text": amount(net)},
+                f"{HEADER}/tabpTAB4": {"text": "Vendor"},
+                f"{HEADER}/tabpTAB5": {"text": "Other"},
+                f"{HEADER}/tabpTAB5/ssubSUB:/COCKPIT/SAPLDISPLAY46:0436/ssubSUB_OTHERS:/COCKPIT/SAPLDISPLAY46:0700/txt/COCKPIT/SDYN_SUBSCR_0700-VALUE3": {"text": "" if ariba else f"BC{doc_number}"},
+                f"{HEADER}/tabpTAB5/ssubSUB:/COCKPIT/SAPLDISPLAY46:0436/ssubSUB_OTHERS:/COCKPIT/SAPLDISPLAY46:0700/txt/COCKPIT/SDYN_SUBSCR_0700-VALUE4": {"text": "" if ariba else "SCAN01"},
+                f"{COCKPIT}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO": {"text": "0,00"},
+                f"{COCKPIT}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_PROPOSAL": {"text": "Proposal"},
+                f"{COCKPIT}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET": {
+                    "type": "table", "visible_rows": 7, "columns": ITEM_COLUMNS,
+                    "rows": [["", str(n + 1), po_number, line[1], line[10], "", line[6], line[7], "", "", "V1"] for n, line in enumerate(lines)]
+                }
+            },
+            "transitions": {**transitions, "wnd[0]/tbar[1]/btn[25]|press": f"document_{len(rows)}_change"}
+        }
+        # the document after take over (btn[25]), see take_over_document
+        document = screens[f"document_{len(rows)}"]
+        editable = change_mode({f"{HEADER}/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-SGTXT": {"text": "", "changeable": True}})
+        screens[f"document_{len(rows)}_change"] = {**document, "title": "Change document", "screen_number": 381,
+                                                   "elements": {**change_mode(document["elements"]), **editable}, "transitions": change_mode(transitions)}
+        rows.append({"DOCNO": doc_number, "COMP_CODE": company_code, "WC_NAME": "", "WC_ICON": "@5D@", "FI_MM_FLG": "MM", "FOLLOW_UP_ICON": ""})
+
+    screens["cockpit_list"] = {
+        "title": "Document list", "transaction": "/COCKPIT/1", "screen_number": 100,
+        "elements": {GRID: {"type": "grid", "rows": rows, "visible_rows": 25}, "wnd[0]/tbar[1]/btn[8]": {"text": "Display document"}},
+        "transitions": {"wnd[0]/tbar[1]/btn[8]|press": "document_{row}"}
+    }
+    return screens, work_list
+
+
+def run_benchmark(screens, work_list, latency=0.0):
+    """
+    This function is used to process the documents of a corpus with SapProcess.process_item against a simulated GUI.
+
+    Parameters:
+    screens (dict): Screens by name, see generate_corpus.
+    work_list (list): (document number, company code) to process.
+    optional: latency (float): Seconds every GUI call takes.
+
+    Returns:
+    dict: docs/hour, GUI calls/doc, p95 seconds per step, the number of documents per outcome and of those which failed, see is_error.
+    """
+    application = SimulatedApplication(screens, 'cockpit_list', latency)
+    session = application.session(0)
+    sap = SapProcess.offline(session, main_path)
+    outcomes = {}
+    errors = 0
+    started = time.perf_counter()
+    for doc_number, company_code in work_list:
+        info = str(sap.process_item(doc_number, company_code))
+        # first words of the message without document numbers, e.g. "Document cannot be processed"
+        outcome = ' '.join(word for word in info.replace('.', ' ').split() if not any(char.isdigit() for char in word))[:60]
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        errors += is_error(info)
+        # every document starts from the cockpit list, as after back_to_cockpit
+        session.start_transaction('/n/COCKPIT/1')
+    seconds = time.perf_counter() - started
+
+    calls = sum(application.calls().values())
+    return {
+        'documents': len(work_list),
+        'latency': latency,
+        'docs_per_hour': round(len(work_list) / seconds * 3600, 1) if seconds else 0.0,
+        'gui_calls_per_doc': round(calls / len(work_list), 1) if work_list else 0.0,
+        'p95': {step: stats['p95'] for step, stats in sap.step_timer.summary().items()},
+        'outcomes': dict(sorted(outcomes.items(), key=lambda item: item[1], reverse=True)),
+        'errors': errors
+    }
+
+
+def compare(result, baseline):
+    """
+    This function is used to compare a benchmark result with a stored one.
+
+    Parameters:
+    result (dict): The result of run_benchmark.
+    baseline (dict): The stored result.
+
+    Returns:
+    list: One line per metric with the baseline, the new value and the change in percent.
+    """
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+
+    lines = []
+    for metric in ('docs_per_hour', 'gui_calls_per_doc'):
+        lines.append(f"{metric}: {baseline.get(metric)} -> {result[metric]} ({change(baseline.get(metric, 0), result[metric])})")
+    for step, seconds in result['p95'].items():
+        old = baseline.get('p95', {}).get(step)
+        if old is not None:
+            lines.append(f"p95 {step}: {old} -> {seconds} ({change(old, seconds)})")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs process_item over a synthetic corpus against the SAP GUI simulator.")
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-lines', type=int, default=8)
+    parser.add_argument('--pos', type=int, default=20, help="number of POs, fewer POs mean more invoices per PO")
+    parser.add_argument('--vendors', type=int, default=10)
+    parser.add_argument('--ariba-share', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--booked-share', type=float, default=0.3, help="share of fully invoiced POs")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per GUI call")
+    parser.add_argument('--baseline', default=os.path.join(main_path, 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    screens, work_list = generate_corpus(args.documents, args.seed, args.max_lines, args.pos, args.vendors, args.ariba_share, error_rate=args.error_rate, booked_share=args.booked_share)
+    result = run_benchmark(screens, work_list, args.latency)
+    print(json.dumps(result, indent=2))
+    if work_list and result['errors'] == len(work_list):
+        # timings of documents which all stop at the first missing field say nothing about the process
+        log("Benchmark failed, no document was processed without an error")
+        sys.exit(1)
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            for line in compare(result, json.load(baseline_file)):
+                print(line)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(result, baseline_file, indent=2)
+        log(f"Baseline {args.baseline} saved")
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+import copy
+import threading
+from rpa_bot.log import lte, log
+
+
+class RunCache:
+    """
+    The RunCache class keeps data read from SAP for reuse by later documents of the run, optionally persisted as JSON.
+
+    Attributes:
+    -----------
+    path : str
+        The path of the JSON file, None to keep the data for this run only.
+    ttl : float
+        Seconds after which an entry is read from SAP again, None for no expiry.
+    entries : dict
+        Value and creation time per key.
+
+    Methods:
+    --------
+    get(self, key) -> object:
+        Returns a copy of the value stored for the key or None if there is none or it has expired.
+
+    put(self, key, value):
+        Stores a copy of the value for the key and writes the file if the cache is persisted.
+
+    update(self, key, values):
+        Merges the values into the dict stored for the key, e.g. to add fields read later.
+
+    invalidate(self, key):
+        Removes the entry of the key.
+
+    stats(self) -> dict:
+        Returns the number of entries, hits and misses.
+    """
+    def __init__(self, path=None, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        # the workers of parallel processing share one cache
+        self.lock = threading.Lock()
+        if self.path:
+            self.load()
+
+    def load(self):
+        try:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                records = json.load(cache_file)
+            for record in records:
+                entry = {'time': record['time'], 'value': record['value']}
+                if not self.is_expired(entry):
+                    self.entries[tuple(record['key'])] = entry
+
+        except Exception as e:
+            # a broken cache file only means the data is read from SAP again
+            log(f"Error in function load. Cache {self.path} not loaded: {e}", lte.error)
+            self.entries = {}
+
+    def save(self):
+        try:
+            records = [{'key': list(key), 'time': entry['time'], 'value': entry['value']} for key, entry in self.entries.items()]
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(records, cache_file)
+            os.replace(temp_path, self.path)
+
+        except Exception as e:
+            log(f"Error in function save. Cache {self.path} not saved: {e}", lte.error)
+
+    def is_expired(self, entry):
+        return self.ttl is not None and time.time() - entry['time'] > self.ttl
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or self.is_expired(entry):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(entry['value'])
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = {'time': time.time(), 'value': copy.deepcopy(value)}
+            if self.path:
+                self.save()
+
+    def update(self, key, values):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or self.is_expired(entry):
+                entry = {'time': time.time(), 'value': {}}
+                self.entries[key] = entry
+            entry['value'].update(copy.deepcopy(values))
+            if self.path:
+                self.save()
+
+    def invalidate(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None and self.path:
+                self.save()
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -1,6 +1,8 @@
 import pandas as pd
 from rpa_bot.log import lte, log
 import os
+import pickle
+import csv
 
 
 class ExcelProcess:
@@ -23,9 +25,45 @@ class ExcelProcess:
     get_calendar(self) -> pd.DataFrame:
         Reads the 'Calendar.xlsx' file from the specified path and filters the rows where 'Entity' is 'Eisen'.
         Returns the filtered DataFrame.
+
+    load_calendar(self) -> dict:
+        Reads 'Calendar.xlsx' once into posting dates keyed by (entity, date) and keeps the last business day of the month next to them.
+
+    get_posting_date(self, company_code, date=None) -> datetime.datetime:
+        Returns the posting date of the company code for the date (today by default) or None if the calendar has none.
+
+    load_reference_data(self) -> dict:
+        Reads the critical suppliers, AMMED FI vendors and vendor matrix workbooks once and indexes them per company code.
+        The indexes are kept in 'reference_data.pickle' until one of the workbooks changes.
+
+    is_vendor_critical(self, vendor, comp_code) -> bool:
+        Returns True if the vendor is in 'critical suppliers.xlsx' for the company code.
+
+    get_cir_code(self, vendor) -> str:
+        Returns the Cir.code of a V436 vendor from 'AMMED FI Fournisseurs.xlsx' or None.
+
+    is_transport_vendor(self, vendor, company_code) -> bool:
+        Returns True if the vendor has type 'transport' in the vendor matrix for the company code.
+
+    get_vendor_matrix(self) -> pd.DataFrame:
+        Returns a copy of 'vendor matrix for RPA.xlsx'.
+
+    read_export(self, path) -> pd.DataFrame:
+        Reads a cockpit export, the tab delimited text export into typed columns or the Excel export.
+
+    excel_pids(self) -> set:
+        Returns the process IDs of the running Excel instances.
+
+    close_excel(self, pids):
+        Kills the Excel processes with the given IDs.
     """
+    reference_files = ['critical suppliers.xlsx', 'AMMED FI Fournisseurs.xlsx', 'vendor matrix for RPA.xlsx']
+
     def __init__(self, path):
         self.path = path
+        self.reference_data = None
+        self.posting_dates = None
+        self.last_business_day_date = None
 
     def last_business_day(self):
         import datetime
@@ -48,6 +86,161 @@ class ExcelProcess:
         except Exception as e:
             log(f"Error in function get_calendar. {e}", lte.error)
     
-    def close_excel(self):
+    def load_calendar(self):
+        try:
+            df_calendar = pd.read_excel(os.path.join(self.path, 'Calendar.xlsx'))
+            posting_dates = {}
+            for entity, date, posting_date in zip(df_calendar['Entity'], pd.to_datetime(df_calendar['Date']), pd.to_datetime(df_calendar['Date to be taken for posting'])):
+                if pd.isna(date) or pd.isna(posting_date):
+                    continue
+                key = (str(entity).strip().upper(), date.strftime('%Y-%m-%d'))
+                # first row of a day wins, as with the former row filter
+                if key not in posting_dates:
+                    posting_dates[key] = posting_date.to_pydatetime()
+            self.posting_dates = posting_dates
+            self.last_business_day_date = self.last_business_day()
+
+            return self.posting_dates
+
+        except Exception as e:
+            log(f"Error in function load_calendar. {e}", lte.error)
+            raise e
+
+    def get_posting_date(self, company_code, date=None):
+        import datetime
+        if self.posting_dates is None:
+            self.load_calendar()
+        if date is None:
+            date = datetime.date.today()
+        return self.posting_dates.get((str(company_code).strip().upper(), date.strftime('%Y-%m-%d')))
+
+    def load_reference_data(self):
+        try:
+            signature = {file_name: os.path.getmtime(os.path.join(self.path, file_name)) for file_name in self.reference_files}
+            cache_path = os.path.join(self.path, 'reference_data.pickle')
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, 'rb') as cache_file:
+                        reference_data = pickle.load(cache_file)
+                    if reference_data.get('signature') == signature:
+                        self.reference_data = reference_data
+                        return self.reference_data
+                except Exception as e:
+                    # a broken cache file only means the workbooks are read again
+                    log(f"Reference data cache {cache_path} not loaded: {e}")
+
+            df_critical_3B5 = pd.read_excel(os.path.join(self.path, 'critical suppliers.xlsx'), sheet_name='AM France 3b5', usecols="A", skiprows=3, engine="openpyxl")
+            df_critical_V436 = pd.read_excel(os.path.join(self.path, 'critical suppliers.xlsx'), sheet_name='AMMED v436', usecols="B", skiprows=3, engine="openpyxl")
+            df_ammed_fi = pd.read_excel(os.path.join(self.path, 'AMMED FI Fournisseurs.xlsx'), sheet_name='UPDATE FOS FI', usecols="A:B", engine="openpyxl")
+            df_vendor_matrix = pd.read_excel(os.path.join(self.path, 'vendor matrix for RPA.xlsx'))
+
+            cir_codes = {}
+            for vendor, cir_code in zip(df_ammed_fi['Vendor'], df_ammed_fi['Cir.code']):
+                # first row of a vendor wins, as with the former row filter
+                if pd.notna(vendor) and vendor not in cir_codes:
+                    cir_codes[vendor] = cir_code
+            df_transport = df_vendor_matrix[df_vendor_matrix['Type'] == 'transport']
+            self.reference_data = {
+                'signature': signature,
+                'critical_vendors': {
+                    '3B5': set(df_critical_3B5['Vendor  ACE'].dropna()),
+                    'V436': set(df_critical_V436['Vendor number ACE'].dropna())
+                },
+                'cir_codes': cir_codes,
+                'transport_vendors': {company_code: set(df['Vendor Id'].dropna()) for company_code, df in df_transport.groupby('Company code')},
+                'vendor_matrix': df_vendor_matrix
+            }
+            try:
+                temp_path = f"{cache_path}.tmp"
+                with open(temp_path, 'wb') as cache_file:
+                    pickle.dump(self.reference_data, cache_file)
+                os.replace(temp_path, cache_path)
+            except Exception as e:
+                log(f"Reference data cache {cache_path} not saved: {e}")
+
+            return self.reference_data
+
+        except Exception as e:
+            log(f"Error in function load_reference_data. {e}", lte.error)
+            raise e
+
+    def get_reference_data(self):
+        if self.reference_data is None:
+            self.load_reference_data()
+        return self.reference_data
+
+    def is_vendor_critical(self, vendor, comp_code):
+        return vendor in self.get_reference_data()['critical_vendors'].get(comp_code, set())
+
+    def get_cir_code(self, vendor):
+        return self.get_reference_data()['cir_codes'].get(vendor)
+
+    def is_transport_vendor(self, vendor, company_code):
+        return vendor in self.get_reference_data()['transport_vendors'].get(company_code, set())
+
+    def get_vendor_matrix(self):
+        return self.get_reference_data()['vendor_matrix'].copy()
+
+    def read_export(self, path):
+        """
+        This function is used to read a cockpit export, the tab delimited text export or the Excel one.
+
+        Parameters:
+        path (str): The export file, '.txt' for the text export.
+
+        Returns:
+        pd.DataFrame: The export with dates as datetime64, amounts as float and numbers as int.
+        """
+        if not str(path).lower().endswith('.txt'):
+            return pd.read_excel(path)
+
+        with open(path, 'rb') as export_file:
+            head = export_file.read(4)
+        if head.startswith((b'\xff\xfe', b'\xfe\xff')):
+            encoding = 'utf-16'
+        elif head.startswith(b'\xef\xbb\xbf'):
+            encoding = 'utf-8-sig'
+        else:
+            encoding = 'utf-8'
+        try:
+            df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False, encoding=encoding, quoting=csv.QUOTE_NONE)
+        except UnicodeDecodeError:
+            # frontend code page of SAP GUI
+            df = pd.read_csv(path, sep='\t', dtype=str, keep_default_na=False, encoding='cp1252', quoting=csv.QUOTE_NONE)
+
+        # the list is framed by empty columns, e.g. a tab at the start of every line
+        df.columns = [str(column).strip() for column in df.columns]
+        df = df[[column for column in df.columns if column and not column.startswith('Unnamed:')]]
+        for column in df.columns:
+            values = df[column].str.strip()
+            filled = values[values != '']
+            if filled.empty:
+                df[column] = values
+            elif filled.str.fullmatch(r'\d{2}\.\d{2}\.\d{4}').all():
+                df[column] = pd.to_datetime(values, format='%d.%m.%Y', errors='coerce')
+            elif filled.str.fullmatch(r'-?[\d.]*\d,\d+-?').all():
+                # 1.234,56- is a negative amount
+                negative = values.str.endswith('-')
+                numbers = pd.to_numeric(values.str.rstrip('-').str.replace('.', '', regex=False).str.replace(',', '.', regex=False), errors='coerce')
+                df[column] = numbers.where(~negative, -numbers)
+            elif filled.str.fullmatch(r'[1-9]\d{0,17}').all() and len(filled) == len(values):
+                df[column] = values.astype('int64')
+            else:
+                df[column] = values
+        return df
+
+    def excel_pids(self):
+        from win32com.client import GetObject
+        try:
+            WMI = GetObject('winmgmts:')
+            return {p.ProcessId for p in WMI.ExecQuery('select ProcessId from Win32_Process where Name = "EXCEL.EXE"')}
+
+        except Exception as e:
+            log(f"Error in function 'excel_pids': {str(e)}", lte.error)
+            return set()
+
+    def close_excel(self, pids):
         import subprocess
-        subprocess.call(["taskkill", "/f", "/im", "EXCEL.EXE"])
+        # only the given Excel processes, the report workbook of the robot may be open in another one
+        for pid in pids:
+            subprocess.call(["taskkill", "/f", "/pid", str(pid)])
@@ -0,0 +1,309 @@
+import os
+import gzip
+import json
+import time
+import types
+import argparse
+import threading
+import collections
+from pathlib import Path
+from rpa_bot.log import lte, log
+
+
+class GuiReplayError(Exception):
+    """Raised where the recorded GUI call raised a COM error, with the same message, or where a call is not in the trace."""
+
+
+class GuiTrace:
+    """
+    The GuiTrace class records every GUI scripting call of a run with its arguments, returned value and duration.
+
+    The trace file is gzipped JSON lines. Object paths are written once as ["p", id, path] and referenced by id,
+    a call is [path id, op, name, args, result, milliseconds] with op 'get', 'set' or 'call' and objects returned as
+    {"$obj": path id} and COM errors as {"$error": message}. Markers ["m", label, data] separate the documents.
+
+    With a path the lines are written to the trace file as they are recorded and the file is flushed at every marker,
+    so a long run does not keep its trace in memory and a failed run keeps the trace of its last documents.
+
+    Attributes:
+    -----------
+    path : str
+        The trace file the lines are written to, None to keep them in lines.
+    lines : list
+        The recorded lines, empty if the trace is written to path.
+    count : int
+        The number of recorded lines.
+    paths : dict
+        Path ids keyed by object path.
+
+    Methods:
+    --------
+    record(self, path, op, name, args, result, seconds):
+        Adds a GUI call.
+
+    mark(self, label, **data):
+        Adds a marker, e.g. the start of a document.
+
+    save(self, path=None):
+        Closes the trace file, or writes the recorded lines to path.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lines = []
+        self.count = 0
+        self.paths = {}
+        # the workers of parallel processing share one trace
+        self.lock = threading.Lock()
+        self.trace_file = gzip.open(path, 'wt', encoding='utf-8') if path else None
+
+    def write(self, line):
+        self.count += 1
+        if self.trace_file is None:
+            self.lines.append(line)
+        elif not self.trace_file.closed:
+            self.trace_file.write(json.dumps(line, separators=(',', ':'), default=str) + '\n')
+
+    def path_id(self, path):
+        if path not in self.paths:
+            self.paths[path] = len(self.paths)
+            self.write(["p", self.paths[path], path])
+        return self.paths[path]
+
+    def record(self, path, op, name, args, result, seconds):
+        with self.lock:
+            if isinstance(result, GuiRecorder):
+                result = {"$obj": self.path_id(result._path)}
+            self.write([self.path_id(path), op, name, args, result, round(seconds * 1000, 1)])
+
+    def mark(self, label, **data):
+        with self.lock:
+            self.write(["m", label, data])
+            if self.trace_file is not None and not self.trace_file.closed:
+                self.trace_file.flush()
+
+    def save(self, path=None):
+        try:
+            with self.lock:
+                if self.trace_file is not None:
+                    path = self.path
+                    self.trace_file.close()
+                else:
+                    with gzip.open(path, 'wt', encoding='utf-8') as trace_file:
+                        for line in self.lines:
+                            trace_file.write(json.dumps(line, separators=(',', ':'), default=str) + '\n')
+            log(f"GUI trace {path} saved, {self.count} lines")
+
+        except Exception as e:
+            log(f"Error in function save. GUI trace {path} not saved: {e}", lte.error)
+
+
+def plain(value):
+    """Returns the value as written to the trace, GUI objects passed as arguments by their path."""
+    if isinstance(value, (GuiRecorder, ReplayObject)):
+        return value._path
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return str(value)
+
+
+class GuiRecorder:
+    """
+    The GuiRecorder class wraps a GUI scripting object and writes every call, property read and property write to a GuiTrace.
+    Objects returned by the wrapped object are wrapped as well, their path is the path of the parent and the call, e.g.
+    /app/con[0]/ses[0].findById("wnd[0]/sbar").
+    """
+    primitives = (str, int, float, bool, bytes, type(None))
+
+    def __init__(self, target, trace, path, method=None):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_trace', trace)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_method', method)
+
+    def _result(self, value, path):
+        if isinstance(value, self.primitives) or isinstance(value, GuiRecorder):
+            return value
+        if isinstance(value, tuple) and all(isinstance(item, self.primitives) for item in value):
+            return value
+        return GuiRecorder(value, self._trace, path)
+
+    def __getattr__(self, name):
+        started = time.perf_counter()
+        try:
+            value = getattr(self._target, name)
+        except Exception as e:
+            self._trace.record(self._path, 'get', name, [], {"$error": str(e)}, time.perf_counter() - started)
+            raise
+        if isinstance(value, (types.MethodType, types.BuiltinMethodType)):
+            # recorded when called
+            return GuiRecorder(value, self._trace, self._path, name)
+        value = self._result(value, f"{self._path}.{name}")
+        self._trace.record(self._path, 'get', name, [], value, time.perf_counter() - started)
+        return value
+
+    def __setattr__(self, name, value):
+        started = time.perf_counter()
+        setattr(self._target, name, value._target if isinstance(value, GuiRecorder) else value)
+        self._trace.record(self._path, 'set', name, [plain(value)], None, time.perf_counter() - started)
+
+    def __call__(self, *args):
+        name = self._method or ''
+        args = [arg._target if isinstance(arg, GuiRecorder) else arg for arg in args]
+        started = time.perf_counter()
+        try:
+            value = self._target(*args)
+        except Exception as e:
+            self._trace.record(self._path, 'call', name, plain(args), {"$error": str(e)}, time.perf_counter() - started)
+            raise
+        value = self._result(value, f"{self._path}.{name}({json.dumps(plain(args))[1:-1]})")
+        self._trace.record(self._path, 'call', name, plain(args), value, time.perf_counter() - started)
+        return value
+
+
+class GuiReplay:
+    """
+    The GuiReplay class answers GUI scripting calls from a trace file, without SAP.
+
+    The recorded results are kept per (object path, op, name, args) and served in the recorded order, the last one is
+    repeated when the replayed code asks more often than the recorded run did. Calls which are not in the trace raise
+    GuiReplayError and are counted as misses.
+
+    Attributes:
+    -----------
+    responses : dict
+        Recorded results and milliseconds per (object path, op, name, args).
+    roots : list
+        Paths of the sessions the recording started from.
+    markers : list
+        (label, data) of the recorded markers.
+    served : collections.Counter
+        Replayed calls per method.
+    misses : collections.Counter
+        Calls which were not in the trace per object path and name.
+
+    Methods:
+    --------
+    session(self, number=0) -> ReplayObject:
+        Returns the recorded session.
+
+    recorded_seconds(self) -> float:
+        Returns the GUI time of the recorded calls which were replayed.
+    """
+    def __init__(self, path):
+        self.responses = collections.defaultdict(collections.deque)
+        self.methods = set()
+        self.roots = []
+        self.markers = []
+        self.served = collections.Counter()
+        self.misses = collections.Counter()
+        self.milliseconds = 0.0
+        paths = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as trace_file:
+            for line in trace_file:
+                line = json.loads(line)
+                if line[0] == 'p':
+                    paths[line[1]] = line[2]
+                    if '.' not in line[2] and line[2] not in self.roots:
+                        self.roots.append(line[2])
+                elif line[0] == 'm':
+                    self.markers.append((line[1], line[2]))
+                else:
+                    path_id, op, name, args, result, milliseconds = line
+                    if isinstance(result, dict) and '$obj' in result:
+                        result = {'$obj': paths[result['$obj']]}
+                    self.responses[self.key(paths[path_id], op, name, args)].append((result, milliseconds))
+                    if op == 'call':
+                        self.methods.add((paths[path_id], name.lower()))
+
+    def key(self, path, op, name, args):
+        # COM names are case insensitive
+        return (path, op, name.lower(), json.dumps(plain(list(args))))
+
+    def session(self, number=0):
+        return ReplayObject(self, self.roots[number])
+
+    def answer(self, path, op, name, args):
+        responses = self.responses.get(self.key(path, op, name, args))
+        if not responses:
+            self.misses[f"{path}.{name}"] += 1
+            raise GuiReplayError(f"{op} {name}{tuple(args) if args else ''} of {path} is not in the trace")
+        result, milliseconds = responses.popleft() if len(responses) > 1 else responses[0]
+        self.served[name if op != 'set' else f"{name}="] += 1
+        self.milliseconds += milliseconds
+        if isinstance(result, dict) and '$error' in result:
+            raise GuiReplayError(result['$error'])
+        if isinstance(result, dict) and '$obj' in result:
+            return ReplayObject(self, result['$obj'])
+        return result
+
+    def recorded_seconds(self):
+        return round(self.milliseconds / 1000, 3)
+
+
+class ReplayObject:
+    """A recorded GUI scripting object, its calls and property reads are answered by GuiReplay."""
+    def __init__(self, replay, path, method=None):
+        object.__setattr__(self, '_replay', replay)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_method', method)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if (self._path, name.lower()) in self._replay.methods:
+            return ReplayObject(self._replay, self._path, name)
+        return self._replay.answer(self._path, 'get', name, [])
+
+    def __setattr__(self, name, value):
+        try:
+            self._replay.answer(self._path, 'set', name, [value])
+        except GuiReplayError:
+            # a write the recorded run did not make changes nothing in the replay
+            pass
+
+    def __call__(self, *args):
+        return self._replay.answer(self._path, 'call', self._method or '', args)
+
+
+def replay_run(trace_path, main_path):
+    """
+    This function is used to process the documents of a recorded run again against its GUI trace.
+
+    Parameters:
+    trace_path (str): The trace file, see SapProcess.enable_gui_trace.
+    main_path (str): The path of the reference workbooks.
+
+    Returns:
+    dict: Documents, Python seconds, recorded GUI seconds of the replayed calls, replayed calls per method, misses and outcomes.
+    """
+    from process_sap import SapProcess
+
+    replay = GuiReplay(trace_path)
+    sap = SapProcess.offline(replay.session(), main_path)
+    outcomes = collections.Counter()
+    documents = [data for label, data in replay.markers if label == 'process_item']
+    started = time.perf_counter()
+    for document in documents:
+        info = str(sap.process_item(document['doc_number'], document['company_code'], document.get('metaData')))
+        # first words of the message without document numbers, e.g. "Document cannot be processed"
+        outcomes[' '.join(word for word in info.replace('.', ' ').split() if not any(char.isdigit() for char in word))[:60]] += 1
+    seconds = time.perf_counter() - started
+    return {
+        'documents': len(documents),
+        'python_seconds': round(seconds, 3),
+        'recorded_gui_seconds': replay.recorded_seconds(),
+        'gui_calls': sum(replay.served.values()),
+        'methods': dict(replay.served.most_common()),
+        'misses': dict(replay.misses.most_common(20)),
+        'outcomes': dict(outcomes.most_common())
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replays a recorded GUI trace against the current process_sap.py.")
+    parser.add_argument('trace')
+    parser.add_argument('--main-path', default=Path(os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+    print(json.dumps(replay_run(args.trace, args.main_path), indent=2))
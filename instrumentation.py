@@ -0,0 +1,239 @@
+import csv
+import sys
+import time
+import threading
+from rpa_bot.log import lte, log
+
+
+class StepTimer:
+    """
+    The StepTimer class records the wall time and GUI calls of every step of every processed document.
+
+    element_lookups counts only the findById calls of find_element, i.e. its cache misses, and undercounts the GUI traffic
+    of a step by far. gui_calls counts every GUI scripting call of the step, it is only recorded with gui_call_stats.
+
+    Attributes:
+    -----------
+    columns : list
+        The columns of the step file.
+    rows : list
+        One dict per recorded step, in the order of the columns.
+
+    Methods:
+    --------
+    record(self, doc_number, company_code, step, seconds, element_lookups=0, gui_calls=None):
+        Adds the duration, element lookups and GUI calls of a step of a document.
+
+    save(self, path):
+        Writes all recorded steps to a CSV file.
+
+    summary(self) -> dict:
+        Returns count, p50, p95 and max seconds and the mean element lookups and GUI calls per step.
+    """
+    columns = ['doc_number', 'company_code', 'step', 'seconds', 'element_lookups', 'gui_calls']
+
+    def __init__(self):
+        self.rows = []
+        # the workers of parallel processing share one timer
+        self.lock = threading.Lock()
+
+    def record(self, doc_number, company_code, step, seconds, element_lookups=0, gui_calls=None):
+        with self.lock:
+            self.rows.append({
+                'doc_number': doc_number,
+                'company_code': company_code,
+                'step': step,
+                'seconds': round(seconds, 3),
+                'element_lookups': element_lookups,
+                'gui_calls': gui_calls
+            })
+
+    def save(self, path):
+        try:
+            with self.lock:
+                rows = list(self.rows)
+            with open(path, 'w', newline='', encoding='utf-8') as step_file:
+                writer = csv.DictWriter(step_file, fieldnames=self.columns, delimiter=';')
+                writer.writeheader()
+                writer.writerows(rows)
+
+        except Exception as e:
+            log(f"Error in function save. Step times {path} not saved: {e}", lte.error)
+
+    def percentile(self, values, percent):
+        # nearest rank on sorted values
+        index = max(0, -(-len(values) * percent // 100) - 1)
+        return values[int(index)]
+
+    def summary(self):
+        with self.lock:
+            rows = list(self.rows)
+        steps = {}
+        for row in rows:
+            steps.setdefault(row['step'], []).append(row)
+        summary = {}
+        for step, step_rows in steps.items():
+            seconds = sorted(row['seconds'] for row in step_rows)
+            summary[step] = {
+                'count': len(seconds),
+                'p50': self.percentile(seconds, 50),
+                'p95': self.percentile(seconds, 95),
+                'max': seconds[-1],
+                'lookups': round(sum(row['element_lookups'] for row in step_rows) / len(step_rows), 1)
+            }
+            gui_calls = [row['gui_calls'] for row in step_rows if row['gui_calls'] is not None]
+            if gui_calls:
+                summary[step]['gui_calls'] = round(sum(gui_calls) / len(gui_calls), 1)
+        # slowest steps first
+        return dict(sorted(summary.items(), key=lambda item: item[1]['p95'], reverse=True))
+
+
+class GuiCallStats:
+    """
+    The GuiCallStats class counts the GUI scripting calls and their latency per method and calling function.
+
+    Attributes:
+    -----------
+    calls : dict
+        Count and total seconds per (calling function, method).
+    helpers : set
+        Functions which only forward GUI calls, the calls are attributed to the function which called them.
+
+    Methods:
+    --------
+    record(self, method, seconds):
+        Adds a call of the method to the function of process_sap.py which made it.
+
+    report(self, top=20) -> list:
+        Returns the calling function, method, count and total seconds of the most expensive calls.
+
+    thread_count(self) -> int:
+        Returns the number of calls made so far by the current thread, e.g. by one worker of parallel processing.
+
+    totals(self, by='method') -> dict:
+        Returns count and total seconds per method or per calling function.
+    """
+    helpers = {'find_element', 'get_session', 'wait_until', 'wait_while_busy', 'run_step', '<lambda>', '<listcomp>', '<genexpr>', '<dictcomp>'}
+
+    def __init__(self):
+        self.calls = {}
+        # calls per thread, the per step counts of a worker must not include the calls of the others
+        self.thread_calls = {}
+        # the workers of parallel processing share one counter
+        self.lock = threading.Lock()
+
+    def caller(self):
+        frame = sys._getframe(2)
+        while frame is not None and (frame.f_code.co_filename == __file__ or frame.f_code.co_name in self.helpers):
+            frame = frame.f_back
+        return frame.f_code.co_name if frame is not None else '?'
+
+    def record(self, method, seconds):
+        key = (self.caller(), method)
+        with self.lock:
+            stats = self.calls.setdefault(key, [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            thread = threading.get_ident()
+            self.thread_calls[thread] = self.thread_calls.get(thread, 0) + 1
+
+    def report(self, top=20):
+        with self.lock:
+            calls = [(caller, method, count, round(seconds, 2)) for (caller, method), (count, seconds) in self.calls.items()]
+        return sorted(calls, key=lambda call: call[3], reverse=True)[:top]
+
+    def thread_count(self):
+        with self.lock:
+            return self.thread_calls.get(threading.get_ident(), 0)
+
+    def totals(self, by='method'):
+        index = 1 if by == 'method' else 0
+        totals = {}
+        with self.lock:
+            for key, (count, seconds) in self.calls.items():
+                stats = totals.setdefault(key[index], [0, 0.0])
+                stats[0] += count
+                stats[1] += seconds
+        return {name: {'count': count, 'seconds': round(seconds, 2)} for name, (count, seconds) in sorted(totals.items(), key=lambda item: item[1][1], reverse=True)}
+
+
+class GuiProxy:
+    """
+    The GuiProxy class wraps a GUI scripting object and records every call and property access in GuiCallStats.
+    Objects returned by the wrapped object are wrapped as well, so findById(...).text is counted too.
+    """
+    primitives = (str, int, float, bool, bytes, tuple, type(None))
+
+    def __init__(self, target, stats, name=''):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_stats', stats)
+        object.__setattr__(self, '_name', name)
+
+    def _wrap(self, value, name):
+        if isinstance(value, self.primitives) or isinstance(value, GuiProxy):
+            return value
+        return GuiProxy(value, self._stats, name)
+
+    def __getattr__(self, name):
+        started = time.perf_counter()
+        value = getattr(self._target, name)
+        if isinstance(value, self.primitives):
+            # property read, e.g. text
+            self._stats.record(name, time.perf_counter() - started)
+            return value
+        # methods are counted when called
+        return self._wrap(value, name)
+
+    def __setattr__(self, name, value):
+        started = time.perf_counter()
+        setattr(self._target, name, value._target if isinstance(value, GuiProxy) else value)
+        self._stats.record(f"{name}=", time.perf_counter() - started)
+
+    def __call__(self, *args):
+        args = [arg._target if isinstance(arg, GuiProxy) else arg for arg in args]
+        started = time.perf_counter()
+        value = self._target(*args)
+        self._stats.record(self._name, time.perf_counter() - started)
+        return self._wrap(value, self._name)
+
+
+class GuiActionProxy:
+    """
+    The GuiActionProxy class wraps a GUI scripting object and calls on_action after every action which can lead to a new screen,
+    e.g. pressing a button, sending a key or scrolling a table control. Objects returned by the wrapped object are wrapped as well.
+    """
+    primitives = GuiProxy.primitives
+    # lower case names, COM names are case insensitive
+    actions = {'press', 'sendvkey', 'select', 'doubleclick', 'doubleclickcurrentcell', 'doubleclicknode', 'clickcurrentcell',
+               'presstoolbarbutton', 'presstoolbarcontextbutton', 'selectcontextmenuitem', 'starttransaction', 'close'}
+    # property writes which make a roundtrip, table controls are sent again after a scroll
+    properties = {'position', 'firstvisiblerow'}
+
+    def __init__(self, target, on_action, name=''):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_on_action', on_action)
+        object.__setattr__(self, '_name', name)
+
+    def _wrap(self, value, name):
+        if isinstance(value, self.primitives) or isinstance(value, GuiActionProxy):
+            return value
+        return GuiActionProxy(value, self._on_action, name)
+
+    def __getattr__(self, name):
+        return self._wrap(getattr(self._target, name), name)
+
+    def __setattr__(self, name, value):
+        try:
+            setattr(self._target, name, value._target if isinstance(value, GuiActionProxy) else value)
+        finally:
+            if name.lower() in self.properties:
+                self._on_action()
+
+    def __call__(self, *args):
+        args = [arg._target if isinstance(arg, GuiActionProxy) else arg for arg in args]
+        try:
+            value = self._target(*args)
+        finally:
+            if self._name.lower() in self.actions:
+                self._on_action()
+        return self._wrap(value, self._name)
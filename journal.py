@@ -0,0 +1,154 @@
+import json
+import os
+import hashlib
+import datetime
+from rpa_bot.log import lte, log
+
+
+def document_key(doc_number, company_code):
+    """
+    This function is used to build the key of a document in the journal and the cockpit indexes, independent of leading zeros and number types.
+
+    Parameters:
+    doc_number (str): The document number.
+    company_code (str): The company code.
+
+    Returns:
+    tuple: (document number, company code)
+    """
+    if isinstance(doc_number, float) and doc_number.is_integer():
+        doc_number = int(doc_number)
+    return (str(doc_number).strip().lstrip('0'), str(company_code).strip().upper())
+
+
+def list_checksum(keys):
+    """
+    This function is used to identify a process list by its documents, independent of their order.
+
+    Parameters:
+    keys (list): The document_key of every document in the list.
+
+    Returns:
+    str: SHA-1 of the sorted keys.
+    """
+    content = '\n'.join(f"{doc_number};{company_code}" for doc_number, company_code in sorted(set(keys)))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class RunJournal:
+    """
+    The RunJournal class keeps the outcome of every processed document in an append-only JSON lines file.
+
+    Attributes:
+    -----------
+    path : str
+        The path of the journal file.
+    entries : dict
+        The last entry per (document number, company code).
+    header : dict
+        Run date and process list checksum of the run which wrote the journal, empty if it has none.
+
+    Methods:
+    --------
+    start(self, run_date, checksum):
+        Starts the journal of a new run with a header line.
+
+    matches(self, run_date, checksum) -> bool:
+        Checks whether the loaded journal was written by a run of this date and process list.
+
+    record(self, doc_number, company_code, status, posting_number='') -> dict:
+        Appends the outcome of a document to the journal and flushes it to disk.
+
+    get(self, doc_number, company_code) -> dict:
+        Returns the last recorded entry of a document or None.
+
+    load(self) -> dict:
+        Reads the entries of an interrupted run, a line cut off by a crash is skipped.
+
+    finish(self):
+        Removes the journal once the report of the run has been written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.header = {}
+
+    def start(self, run_date, checksum):
+        try:
+            self.header = {'run_date': str(run_date), 'list_checksum': checksum}
+            self.entries = {}
+            with open(self.path, 'w', encoding='utf-8') as journal_file:
+                journal_file.write(json.dumps(self.header) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+        except Exception as e:
+            log(f"Error in function start. {e}", lte.error)
+            raise e
+
+    def matches(self, run_date, checksum):
+        return self.header.get('run_date') == str(run_date) and self.header.get('list_checksum') == checksum
+
+    def record(self, doc_number, company_code, status, posting_number=''):
+        try:
+            key = document_key(doc_number, company_code)
+            entry = {
+                'doc_number': key[0],
+                'company_code': key[1],
+                'status': str(status),
+                'posting_number': str(posting_number),
+                'time': datetime.datetime.now().isoformat(timespec='seconds')
+            }
+            with open(self.path, 'a', encoding='utf-8') as journal_file:
+                journal_file.write(json.dumps(entry) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self.entries[key] = entry
+
+            return entry
+
+        except Exception as e:
+            log(f"Error in function record. Doc number {doc_number}: {e}", lte.error)
+            raise e
+
+    def get(self, doc_number, company_code):
+        return self.entries.get(document_key(doc_number, company_code))
+
+    def load(self):
+        try:
+            self.entries = {}
+            self.header = {}
+            if not os.path.exists(self.path):
+                return self.entries
+            with open(self.path, 'r', encoding='utf-8') as journal_file:
+                content = journal_file.read()
+            for line in content.splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of a run which died while writing it
+                    continue
+                if 'run_date' in entry:
+                    self.header = entry
+                    continue
+                self.entries[document_key(entry['doc_number'], entry['company_code'])] = entry
+            if content and not content.endswith('\n'):
+                # start the next entry on its own line
+                with open(self.path, 'a', encoding='utf-8') as journal_file:
+                    journal_file.write('\n')
+
+            return self.entries
+
+        except Exception as e:
+            log(f"Error in function load. {e}", lte.error)
+            raise e
+
+    def finish(self):
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.entries = {}
+            self.header = {}
+
+        except Exception as e:
+            log(f"Error in function finish. {e}", lte.error)
@@ -4,6 +4,8 @@ from pathlib import Path
 from rpa_bot.bot import Bot
 from process_sap import SapProcess
 from notifications import Notifications
+from journal import RunJournal, document_key, list_checksum
+from cache import RunCache
 from rpa_bot.log import lte, log
 
 class ConfigModel:
@@ -23,11 +25,10 @@ class Task(Bot): # Process
         super().__init__(sysargs)
 
     def run_bot(self):
-        from excel import ExcelProcess
-        import xlwings as xw
         import os
         import datetime
         import shutil
+        import threading
         import pandas as pd
 
         # sap system, vault dict, credentials.item_name, client  (ew language)
@@ -37,9 +38,10 @@ class Task(Bot): # Process
                      self.config.pce_ace, 
                      client=self.config.sap_client,
                      main_path=self.config.main_path) as sap:
+            report_path = ''
+            df_report = pd.DataFrame()
             try:
                 self.replace_body = None
-                excel = ExcelProcess(self.main_path)
                 notifications = Notifications()
                 # parameters
                 exception_list = []
@@ -51,12 +53,21 @@ class Task(Bot): # Process
                 layout_cockpit1 = self.config.layout_cockpit1
                 # layout_cockpit2 = self.config.layout_cockpit2
 
+                sap.export_format = self.config.export_format or 'xlsx'
+                if self.config.gui_trace:
+                    sap.enable_gui_trace(os.path.join(self.temp_path, 'FR_guiTrace.jsonl.gz'))
+                if self.config.gui_call_stats:
+                    sap.enable_gui_stats()
+                # reference workbooks and the calendar are read once, not per document
+                sap.excel.load_reference_data()
+                sap.excel.load_calendar()
+
                 file_name = 'Export.xlsx'
                 action = 'r'
                 posting_date = datetime.datetime.today()
                 day = posting_date.day
                 if day <= 2:
-                    posting_date = excel.last_business_day()
+                    posting_date = sap.excel.last_business_day_date
                 manual_trigger = False
                 if len(sys.argv) > 3:
                     email_subject = sys.argv[3]
@@ -65,13 +76,38 @@ class Task(Bot): # Process
                     check_delay_start = lambda x: '_delayStart' in x
                     action = check_delay_start(email_subject) # email_subject[-1]
 
-                if manual_trigger:
+                vendor_cache_ttl_hours = self.config.vendor_cache_ttl_hours or 0
+                if vendor_cache_ttl_hours:
+                    # vendor master data is kept between runs
+                    sap.vendor_cache = RunCache(os.path.join(self.config.main_path, 'vendor_cache.json'), vendor_cache_ttl_hours * 3600)
+
+                # a journal next to the process list means the previous run was interrupted, skip the export
+                journal = RunJournal(os.path.join(self.temp_path, 'FR_runJournal.jsonl'))
+                process_list_path = os.path.join(self.temp_path, 'FR_readyToProcess.xlsx')
+                run_date = datetime.date.today().isoformat()
+                resume = os.path.exists(journal.path) and os.path.exists(process_list_path)
+                if resume:
+                    journal.load()
+                    df_processable_docs = pd.read_excel(process_list_path, sheet_name='MM_FR_readyToProcess')
+                    # the result columns and their padding are added again below
+                    df_processable_docs = df_processable_docs.drop(columns=['Invoice document number', 'Processing status'], errors='ignore')
+                    df_processable_docs = df_processable_docs.loc[:, ~df_processable_docs.columns.astype(str).str.startswith('Unnamed:')]
+                    df_processable_docs = df_processable_docs.where(df_processable_docs.notna(), '')
+                    # only a run of today with the same process list is continued
+                    resume = journal.matches(run_date, self.process_list_checksum(df_processable_docs))
+                    if not resume:
+                        log(f"Journal {journal.path} belongs to another run or process list, documents exported again")
+                if resume:
+                    log(f"Run resumed from {journal.path}, {len(journal.entries)} documents already processed")
+                elif manual_trigger:
                     # list of documents provided by client
+                    journal.finish()
                     df_vendors = sap.get_vendors(manual_trigger)
                     sap.setup_cockpit(variant_cockpit, layout_cockpit1, df_vendors['Vendor Id'])
                     log('Cockpit with paramenters run')
                     df_processable_docs = sap.get_data_for_process(manual_trigger, file_name, self.temp_path, path_attachments)
                 else:
+                    journal.finish()
                     df_vendors_by_comp = sap.get_vendors(manual_trigger)
                     df_processable_docs = pd.DataFrame()
                     for company_code, df_vendors in df_vendors_by_comp:
@@ -79,67 +115,84 @@ class Task(Bot): # Process
                         log('Cockpit with paramenters run')
                         df_processable_docs = sap.get_data_for_process(manual_trigger, file_name, self.temp_path, None, df_processable_docs, company_code)
 
+                meta_data_index = sap.build_meta_data_index(df_processable_docs)
+                unsupported_wf_statuses = self.config.unsupported_wf_statuses or []
                 file_name = sap.prepare_process_list(self.temp_path, df_processable_docs)
                 log(f"List of documents to process {file_name} saved")
+                if not resume:
+                    journal.start(run_date, self.process_list_checksum(df_processable_docs))
 
                 report_path = os.path.join(self.temp_path, file_name)
                 self.mail_attachments = [report_path]
-                company_code = df_vendors_by_comp[0:][0][0]
-                company_code2 = df_vendors_by_comp[1:][0][0]
+                if not resume:
+                    company_code = df_vendors_by_comp[0:][0][0]
+                    company_code2 = df_vendors_by_comp[1:][0][0]
                 sap.setup_cockpit(variant_cockpit, layout_cockpit1, company_code, pd.DataFrame(), company_code2)
 
-                wb = xw.Book(os.path.join(self.temp_path, file_name))
-                log(f"Excel: {file_name} opened")
-                app = wb.api.Application
-                ws_data = wb.sheets["MM_FR_readyToProcess"]
-                ws_data.range(1, 33).value = 'Invoice document number'
-                ws_data.range(1, 34).value = 'Processing status'
-                last_row = ws_data.api.Cells.Find(What="*",
-                            After=ws_data.api.Cells(1, 1),
-                            LookAt=xw.constants.LookAt.xlPart,
-                            LookIn=xw.constants.FindLookIn.xlFormulas,
-                            SearchOrder=xw.constants.SearchOrder.xlByRows,
-                            SearchDirection=xw.constants.SearchDirection.xlPrevious,
-                            MatchCase=False).Row
-                log(f"{file_name} read")
+                # results are kept in df_report and the journal, the report is written once at the end
+                df_report = self.add_result_columns(df_processable_docs.reset_index(drop=True))
+                for index in df_report.index:
+                    entry = journal.get(int(df_report.iat[index, 4]), df_report.iat[index, 6])
+                    if entry is not None:
+                        df_report.at[index, 'Invoice document number'] = entry['posting_number']
+                        df_report.at[index, 'Processing status'] = entry['status']
+                pending = [index for index in df_report.index if df_report.at[index, 'Processing status'] == '']
+                self.results_lock = threading.Lock()
                 log("Document processing started...") 
 
-                for index in range(2, last_row + 1): 
-                    docNumber = int(ws_data.range(index, 5).value) 
-                    company_code = ws_data.range(index, 7).value
-                    status = ws_data.range(index, 34).value
-
-                    if status is None: 
-                        info = sap.process_item(docNumber, company_code) 
-                        if str(info).isnumeric():
-                            self.counters.inc_success()
-                            ws_data.range(index, 33).value = info
-                            ws_data.range(index, 34).value = f"Document posted with number {info}"
-                            wb.save()
-                        elif str(info).find('The control could not be found by id.') != -1 or str(info).find('Error in function openInvoice') != -1 or str(info).find('The object invoked has disconnected') != -1:
-                            self.counters.inc_error()
-                            info1 = f"Document {docNumber} cannot be processed. The control could not be found by id."
-                            info2 = str(info).split('.')[0] + ". The control could not be found by id."
-                            exception_list.append([docNumber, info2])
-                            ws_data.range(index, 34).value = info1
-                            wb.save()
-                            if index < last_row:
+                parallel_sessions = min(int(self.config.parallel_sessions or 1), 5)
+                po_groups = sap.po_groups(df_report, pending) if parallel_sessions > 1 else []
+                if len(po_groups) > 1:
+                    session_ids = sap.open_worker_sessions(min(parallel_sessions, len(po_groups)) - 1)
+                    log(f"Documents processed in {len(session_ids)} SAP sessions")
+                    # all documents of a PO go to one worker, the largest groups first to the worker with the fewest documents
+                    worker_indexes = [[] for _ in session_ids]
+                    for group in sorted(po_groups, key=len, reverse=True):
+                        min(worker_indexes, key=len).extend(group)
+                    threads = []
+                    for nr, session_id in enumerate(session_ids):
+                        worker = sap.create_worker(session_id)
+                        indexes = sorted(worker_indexes[nr])
+                        thread = threading.Thread(target=self.run_worker, args=(worker, indexes, df_report, journal, meta_data_index, unsupported_wf_statuses, exception_list, (variant_cockpit, layout_cockpit1, company_code, company_code2), nr == 0), name=f"SAP {session_id}")
+                        thread.start()
+                        threads.append(thread)
+                    for thread in threads:
+                        thread.join()
+                    sap.close_worker_sessions(session_ids)
+                else:
+                    cockpit = (variant_cockpit, layout_cockpit1, company_code, company_code2)
+                    standby_session = self.config.standby_session and len(pending) > 1
+                    if standby_session:
+                        sap.open_standby_session(cockpit)
+                    for index in pending:
+                        action = self.process_document(sap, df_report, index, journal, meta_data_index, unsupported_wf_statuses, exception_list)
+                        if action == 'reconnect' and index != pending[-1]:
+                            if not (standby_session and sap.switch_to_standby_session()):
                                 sap.close_session()
                                 sap.connect()
-                                sap.setup_cockpit(variant_cockpit, layout_cockpit1, company_code, pd.DataFrame(), company_code2)
-                        elif str(info).find('Document has not been found') != -1:
-                            self.counters.inc_success()
-                            ws_data.range(index, 34).value = f"{info}"
-                            wb.save()
-                        else:
-                            self.counters.inc_success()
-                            ws_data.range(index, 34).value = f"{info}"
-                            wb.save()
+                                sap.setup_cockpit(variant_cockpit, layout_cockpit1, df_report.iat[index, 6], pd.DataFrame(), company_code2)
+                            if standby_session:
+                                sap.open_standby_session(cockpit)
+                        elif action == 'back_to_cockpit':
                             sap.back_to_cockpit()
+                    sap.close_standby_session()
                 log("Documents processing finished")
-                wb.save()
+                log(f"Screen ID resolver: {sap.screen_id_stats()}")
+                log(f"GUI waits: {sap.wait_stats()}")
+                log(f"Vendor cache: {sap.vendor_cache.stats()}")
+                log(f"PO cache: {sap.po_cache.stats()}")
+                sap.prepare_process_list(self.temp_path, df_report)
                 log(f"Report {file_name} saved")
-                app.Quit()
+                sap.step_timer.save(os.path.join(self.temp_path, 'FR_stepTimes.csv'))
+                for step, step_summary in sap.step_timer.summary().items():
+                    log(f"Step {step}: {step_summary}")
+                if sap.gui_stats is not None:
+                    gui_report = sap.gui_stats_report()
+                    log(f"GUI calls per method: {gui_report['methods']}")
+                    log(f"GUI calls per function: {gui_report['functions']}")
+                    for caller, method, count, seconds in gui_report['top']:
+                        log(f"GUI calls {caller}.{method}: {count} calls, {seconds} s")
+                journal.finish()
                 sap.close_session()
                 log("SAP user logged out")
                 # if there is no error and we reached to this point than it is success
@@ -150,9 +203,11 @@ class Task(Bot): # Process
                     sap.kill_sap()
                 if sap.sap_exists():       
                     sap.close_session()
-                if os.path.exists(report_path):
-                    wb.save()
-                    app.Quit()
+                if os.path.exists(report_path) and not df_report.empty:
+                    sap.prepare_process_list(self.temp_path, df_report)
+            finally:
+                # the trace is written while it is recorded, also the one of a failed run is closed
+                sap.save_gui_trace()
             # send exceptions 
             if exception_list:
                 mail_subject = "RPA Bot: MMInvoiceFrance Exceptions"
@@ -171,6 +226,116 @@ class Task(Bot): # Process
             log(f"Report {file_name} archived")
             return True
         
+    def process_list_checksum(self, df_processable_docs):
+        """
+        Returns the checksum of the document numbers and company codes (columns E and G) of the process list, see journal.list_checksum.
+        """
+        if df_processable_docs.empty:
+            return list_checksum([])
+        return list_checksum([document_key(doc_number, company_code) for doc_number, company_code in df_processable_docs.iloc[:, [4, 6]].itertuples(index=False, name=None)])
+
+    def add_result_columns(self, df_report):
+        """
+        Adds the 'Invoice document number' and 'Processing status' columns at the fixed report positions AG and AH (33 and 34),
+        shorter exports are padded with empty columns, the export columns from AG on move to the right.
+        """
+        for position, column in enumerate(['Invoice document number', 'Processing status'], start=32):
+            while len(df_report.columns) < position:
+                df_report.insert(len(df_report.columns), '', '', allow_duplicates=True)
+            df_report.insert(position, column, '')
+        return df_report
+
+    def process_document(self, sap, df_report, index, journal, meta_data_index, unsupported_wf_statuses, exception_list):
+        """
+        Processes the document in row index of df_report and records the result in df_report and the journal.
+
+        Returns 'reconnect' if the SAP session has to be set up again, 'back_to_cockpit' if the document
+        is still open and '' otherwise.
+        """
+        docNumber = int(df_report.iat[index, 4])
+        company_code = df_report.iat[index, 6]
+        posting_number = ''
+        action = ''
+        metaData = meta_data_index.get(document_key(docNumber, company_code))
+        if metaData is not None and not sap.is_wf_status_supported(metaData, unsupported_wf_statuses):
+            with self.results_lock:
+                self.counters.inc_success()
+                status = f"Document {docNumber} cannot be processed. Workflow status {metaData['WFstatus']} is not supported"
+                df_report.at[index, 'Processing status'] = status
+                journal.record(docNumber, company_code, status)
+            return action
+
+        info = sap.process_item(docNumber, company_code, metaData) 
+        with self.results_lock:
+            if str(info).isnumeric():
+                self.counters.inc_success()
+                posting_number = info
+                status = f"Document posted with number {info}"
+            elif str(info).find('The control could not be found by id.') != -1 or str(info).find('Error in function openInvoice') != -1 or str(info).find('The object invoked has disconnected') != -1:
+                self.counters.inc_error()
+                info2 = str(info).split('.')[0] + ". The control could not be found by id."
+                exception_list.append([docNumber, info2])
+                status = f"Document {docNumber} cannot be processed. The control could not be found by id."
+                action = 'reconnect'
+            elif str(info).find('Document has not been found') != -1:
+                self.counters.inc_success()
+                status = f"{info}"
+            else:
+                self.counters.inc_success()
+                status = f"{info}"
+                action = 'back_to_cockpit'
+
+            df_report.at[index, 'Invoice document number'] = posting_number
+            df_report.at[index, 'Processing status'] = status
+            journal.record(docNumber, company_code, status, posting_number)
+
+        return action
+
+    def run_worker(self, worker, indexes, df_report, journal, meta_data_index, unsupported_wf_statuses, exception_list, cockpit, cockpit_ready=False):
+        """
+        Processes the documents in rows indexes of df_report in the own SAP session of the worker, runs in a thread.
+        cockpit holds the variant, layout and both company codes for setup_cockpit, cockpit_ready is True for the
+        session the run set the cockpit up in already.
+        """
+        import pandas as pd
+        variant_cockpit, layout_cockpit1, company_code, company_code2 = cockpit
+        try:
+            worker.attach_worker_session()
+            if not cockpit_ready:
+                worker.setup_cockpit(variant_cockpit, layout_cockpit1, company_code, pd.DataFrame(), company_code2)
+            for index in indexes:
+                action = self.process_document(worker, df_report, index, journal, meta_data_index, unsupported_wf_statuses, exception_list)
+                if worker.session_lost:
+                    break
+                if action == 'reconnect':
+                    # other sessions keep working, only the cockpit of this one is opened again
+                    worker.setup_cockpit(variant_cockpit, layout_cockpit1, company_code, pd.DataFrame(), company_code2)
+                elif action == 'back_to_cockpit':
+                    worker.back_to_cockpit()
+            log(f"Worker {worker.session_ids[0]} finished. Screen ID resolver: {worker.screen_id_stats()}")
+        except Exception as e:
+            log(f"Worker {worker.session_ids[0]} stopped: {e}", lte.error)
+        finally:
+            self.fail_abandoned_documents(df_report, indexes, journal, exception_list, worker.session_ids[0])
+            worker.detach_worker_session()
+
+    def fail_abandoned_documents(self, df_report, indexes, journal, exception_list, session_id):
+        """
+        Records the documents in rows indexes of df_report which a stopped worker has not processed as failed,
+        in df_report and the journal.
+        """
+        with self.results_lock:
+            for index in indexes:
+                if df_report.at[index, 'Processing status'] != '':
+                    continue
+                docNumber = int(df_report.iat[index, 4])
+                company_code = df_report.iat[index, 6]
+                self.counters.inc_error()
+                status = f"Document {docNumber} cannot be processed. SAP session {session_id} was lost"
+                exception_list.append([docNumber, status])
+                df_report.at[index, 'Processing status'] = status
+                journal.record(docNumber, company_code, status)
+
 
 if __name__ == '__main__':     
     # Child class context manager
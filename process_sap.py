@@ -3,9 +3,15 @@ from rpa_bot.log import lte, log
 import pandas as pd
 import os
 import glob
+import copy
+import threading
 from datetime import datetime, timedelta
 import time
 from excel import ExcelProcess
+from cache import RunCache
+from journal import document_key
+from instrumentation import StepTimer, GuiCallStats, GuiProxy, GuiActionProxy
+from gui_trace import GuiTrace, GuiRecorder
 
 
 class ToleranceRange:
@@ -21,29 +27,130 @@ class POType:
     Standard = 'Standard'
 
 
+class ScreenContainer:
+    """Name prefixes of the main subscreen containers under wnd[0]/usr and the offset to their screen numbers."""
+    megui = ('subSUB0:SAPLMEGUI:', 0)
+    cockpit = ('subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:', 0)
+    bp = ('subSCREEN_3000_RESIZING_AREA:SAPLBUS_LOCATOR:', 2000)
+
+
 class SapProcess(SAP):
 
 
     """extension of SAP class"""
     def __init__(self, sap_system, vault_dict, credentials, config, client, main_path):
+        # GUI call counters and trace, None unless enable_gui_stats or enable_gui_trace was called
+        self.gui_stats = None
+        self.gui_trace = None
         super().__init__(sap_system, vault_dict, credentials, client=client)
+        self.setup_process(sap_system, main_path)
+
+    @classmethod
+    def offline(cls, gui_session, main_path, sap_system='ACE'):
+        """
+        This function is used to create a process which works in a given GUI session without a logon, e.g. a simulated one.
+
+        Parameters:
+        gui_session (object): The GUI session.
+        main_path (str): The path of the reference workbooks.
+        optional: sap_system (str): The SAP system name.
+
+        Returns:
+        SapProcess: The process.
+        """
+        process = cls.__new__(cls)
+        process.gui_stats = None
+        process.gui_trace = None
+        process.setup_process(sap_system, main_path)
+        process.gui_connection = gui_session.Parent
+        process.sessions = {0: gui_session}
+        process.gui_session = gui_session
+        return process
+
+    def setup_process(self, sap_system, main_path):
+        """
+        This function is used to set up the state of the process which does not depend on the SAP logon.
+
+        Parameters:
+        sap_system (str): The SAP system name.
+        main_path (str): The path of the reference workbooks.
+        """
         self.sap_system = sap_system
         self.excel = ExcelProcess(main_path)
-
-    def process_item(self, doc_number, company_code):
+        # 'text' for the tab delimited export, 'xlsx' for the Excel export, see generate_export_file
+        self.export_format = 'xlsx'
+        # read screen numbers from wnd[0]/usr children instead of probing candidates
+        self.screen_discovery = True
+        # only one additional (XK03) session at a time, shared by the workers of parallel processing
+        self.helper_session_lock = threading.Lock()
+        # GUI session IDs per session number, set for the workers of parallel processing, see get_session
+        self.session_ids = {}
+        # a worker never kills saplogon, the sessions of the other workers run in it, see kill_sap
+        self.worker = False
+        self.session_lost = False
+        # second session kept at the cockpit to replace a broken one, see open_standby_session
+        self.standby_session_id = None
+        self.standby_thread = None
+        self.standby_ready = False
+        # VAT numbers, bank IDs and interco flag per (vendor, company code), see get_vendor_details
+        self.vendor_cache = RunCache()
+        # PO data which does not depend on the invoice per PO number, see get_po_snapshot
+        self.po_cache = RunCache()
+        # duration of every step of process_item per document, see run_step
+        self.step_timer = StepTimer()
+        self.reset_process_state()
+
+    def reset_process_state(self):
+        """
+        This function is used to reset the caches and counters kept for the GUI session this object works in.
+        """
+        # last matching screen number per (type, tab, session_nr, middle_path_id)
+        self.screen_id_cache = {}
+        self.screen_id_hits = 0
+        self.screen_id_misses = 0
+        self.screen_id_discovered = 0
+        self.screen_id_discovery_misses = 0
+        # GUI session handles per session number, see get_session
+        self.sessions = {}
+        # resolved GUI components per element ID, valid until an action can change the screen, see find_element
+        self.element_cache = {}
+        # cockpit list row per (document number, company code), see build_document_index
+        self.document_index = None
+        self.document_index_rows = 0
+        self.use_document_index = True
+        # cockpit list row and key of the document being processed
+        self.current_row = 0
+        self.current_document = None
+        # count, total and longest duration and timeouts per wait name, see wait_until
+        self.wait_stats_by_name = {}
+        # POs whose snapshot was used for the current document, see invalidate_po_snapshots
+        self.document_po_numbers = set()
+        # document whose steps are timed and the number of findById calls of find_element, see run_step
+        self.timed_document = (None, None)
+        self.element_lookups = 0
+
+    def process_item(self, doc_number, company_code, metaData=None):
         """
         This function is used to process an item in cockpit.
 
         Parameters:
         doc_number (str): The document number.
         company_code (str): The company code.
+        optional: metaData (dict): The metadata from build_meta_data_index, read from the cockpit list if not given.
 
         Returns:
         Bool: True if the item was successfully processed, False otherwise.
         """
+        started = time.perf_counter()
+        lookups = self.element_lookups
+        gui_calls = self.gui_call_count()
+        self.timed_document = (doc_number, company_code)
+        if self.gui_trace is not None:
+            self.gui_trace.mark('process_item', doc_number=doc_number, company_code=company_code, metaData=metaData)
         try:
             info = ''
             go_to_final_steps = False
+            self.document_po_numbers = set()
             check_po_line_entry_data = {
                 'how_many_lines': 0, 
                 'value': 0.00, 
@@ -60,32 +167,33 @@ class SapProcess(SAP):
             }
 
             # Step 
-            if not self.find_invoice(doc_number, company_code):
+            if not self.run_step('find_invoice', self.find_invoice, doc_number, company_code):
                 return f"{doc_number}. Document has not been found"
 
             # get workflow status, description, doc type (MM/FI), FuF, company code
-            metaData = self.get_meta_data(doc_number)
+            if metaData is None:
+                metaData = self.run_step('get_meta_data', self.get_meta_data, doc_number)
 
             # Step 
-            if not self.open_invoice(doc_number):
+            if not self.run_step('open_invoice', self.open_invoice, doc_number):
                 return f"Document {doc_number} cannot be processed. Error during opening the document"
 
             # check workflow status and description
             # if self.check_meta_data(doc_number, metaData):
 
             # get PO number from workflow description
-            info = self.get_wf_status_po_nr(doc_number, metaData)
+            info = self.run_step('get_wf_status_po_nr', self.get_wf_status_po_nr, doc_number, metaData)
             if 'cannot be processed' in info:
                 return info
             given_po = info
 
             # check saldo based on workflow status
-            info = self.wf_status_invoice_price_difference(doc_number, metaData)
+            info = self.run_step('wf_status_invoice_price_difference', self.wf_status_invoice_price_difference, doc_number, metaData)
             if info != False and 'final steps' in info:
                 go_to_final_steps = True
 
             # Step
-            document_source = self.check_document_source(doc_number)
+            document_source = self.run_step('check_document_source', self.check_document_source, doc_number)
             
             if go_to_final_steps == False and info is False and document_source != 'PDFCollector':
                 # Document ws status saldo is not 0
@@ -93,7 +201,7 @@ class SapProcess(SAP):
                     return info
                 # do if source = Ariba
                 elif document_source == 'Ariba':
-                    process_data = self.process_ariba(doc_number, given_po)
+                    process_data = self.run_step('process_ariba', self.process_ariba, doc_number, given_po)
                     if 'ERROR' in str(process_data).upper() or 'CANNOT BE PROCESSED' in str(process_data).upper():
                         return process_data
                     if 'final steps' in process_data:
@@ -101,18 +209,18 @@ class SapProcess(SAP):
             
             if go_to_final_steps == False:
                 # do if source = PDF_collector
-                process_data = self.process_pdf_collector(doc_number, given_po)
+                process_data = self.run_step('process_pdf_collector', self.process_pdf_collector, doc_number, given_po)
                 if 'ERROR' in str(process_data).upper() or 'CANNOT BE PROCESSED' in str(process_data).upper():
                     return process_data
                 # Step
-                if not self.take_over_document(doc_number):
+                if not self.run_step('take_over_document', self.take_over_document, doc_number):
                     return f"Document {doc_number} cannot be processed. Error during taking over the document"
                 # Step
-                info = self.check_doc_type(doc_number)
+                info = self.run_step('check_doc_type', self.check_doc_type, doc_number)
                 if info is not True:
                     return info
                 # Step
-                info = self.check_process_data(doc_number, company_code, process_data[1], check_po_line_entry_data)
+                info = self.run_step('check_process_data', self.check_process_data, doc_number, company_code, process_data[1], check_po_line_entry_data)
                 # if 'ERROR' in str(info).upper() or 'CANNOT BE PROCESSED' in str(info).upper():
                 if info is not True:
                     if 'ERROR' in str(info).upper() or 'CANNOT BE PROCESSED' in str(info).upper():
@@ -122,74 +230,106 @@ class SapProcess(SAP):
 
                 # Step
                 if go_to_final_steps == False:
-                    info = self.process_po_types(doc_number, company_code, process_data[1], check_po_line_entry_data)
+                    info = self.run_step('process_po_types', self.process_po_types, doc_number, company_code, process_data[1], check_po_line_entry_data)
                     if info is not True:
                         return info
 
             # Step
-            check_vmd = self.check_vmd(doc_number)
+            check_vmd = self.run_step('check_vmd', self.check_vmd, doc_number, company_code)
             if not isinstance(check_vmd, tuple):
                 return check_vmd
 
             # Step
-            info = self.check_permitted_payee(doc_number)
+            info = self.run_step('check_permitted_payee', self.check_permitted_payee, doc_number)
             if info is True:
                 return f'Vendor is excluded from posting. Document {doc_number} cannot be processed.'
             elif info != False: # and "is marked for deletion" in info:
                 return f"Document {doc_number} cannot be processed. {info}"
             
             # Step
-            info = self.check_fields(doc_number)
+            info = self.run_step('check_fields', self.check_fields, doc_number)
             if info is not True:
                 return info                    
 
             #TODO: Step - (check)
-            info = self.check_po(doc_number)
+            info = self.run_step('check_po', self.check_po, doc_number)
             if len(info) != 0:
                 return f"PO and invoice have different: {info}"
 
             # Step
-            info = self.check_dates(doc_number, company_code)
+            info = self.run_step('check_dates', self.check_dates, doc_number, company_code)
             if info is not True:
                 return f"Error during setting posting date: {info}"
 
             # Step
-            info = self.check_bank_ids(doc_number, check_vmd[1], process_data[1])
+            info = self.run_step('check_bank_ids', self.check_bank_ids, doc_number, check_vmd[1], process_data[1])
             if info is not True:
                 return info
 
             # Step
-            info = self.check_saldo(doc_number)
+            info = self.run_step('check_saldo', self.check_saldo, doc_number)
             if info is not True:
                 return info
 
             # Step
-            info = self.check_tax_code(doc_number, check_po_line_entry_data)
+            info = self.run_step('check_tax_code', self.check_tax_code, doc_number, check_po_line_entry_data)
             if info is not True:
                 return info[1]
 
             #TODO: Step - (check) check_before_book
-            info = self.check_before_book(doc_number)
+            info = self.run_step('check_before_book', self.check_before_book, doc_number)
             if info is not True:
                 return info
 
             #TODO: Step - (check) perform_booking_action
-            info = self.perform_booking_action(doc_number)
+            info = self.run_step('perform_booking_action', self.perform_booking_action, doc_number)
             if info != '':
-                postingNumber = self.get_posting_number(doc_number)
+                # totals of the POs change with the posting
+                self.invalidate_po_snapshots()
+                postingNumber = self.run_step('get_posting_number', self.get_posting_number, doc_number)
                 return postingNumber
             else:
                 return info              
 
         except Exception as e:
             return str(e)
+        finally:
+            self.step_timer.record(doc_number, company_code, 'process_item', time.perf_counter() - started, self.element_lookups - lookups, self.gui_call_delta(gui_calls))
+
+    def run_step(self, step, function, *args):
+        """
+        This function is used to run a step of process_item and record its duration for the current document.
+
+        Parameters:
+        step (str): The step name.
+        function (callable): The step.
+        args: The arguments of the step.
+
+        Returns:
+        The result of the step.
+        """
+        started = time.perf_counter()
+        lookups = self.element_lookups
+        gui_calls = self.gui_call_count()
+        try:
+            return function(*args)
+        finally:
+            doc_number, company_code = self.timed_document
+            self.step_timer.record(doc_number, company_code, step, time.perf_counter() - started, self.element_lookups - lookups, self.gui_call_delta(gui_calls))
+
+    def gui_call_count(self):
+        # GUI calls of this thread so far, None unless enable_gui_stats was called
+        return self.gui_stats.thread_count() if self.gui_stats is not None else None
+
+    def gui_call_delta(self, gui_calls):
+        return self.gui_call_count() - gui_calls if gui_calls is not None else None
     
     def get_vendors(self, manual_trigger):
         try:
             if manual_trigger:
-                df_vendors = pd.read_excel('vendor matrix for RPA.xlsx')
+                df_vendors = self.excel.get_vendor_matrix()
             else:
-                df = pd.read_excel('vendor matrix for RPA.xlsx')
+                df = self.excel.get_vendor_matrix()
                 df_vendors = [
                     ('3B5', df[df['Company code'] == '3B5']),
                     ('V436', df[df['Company code'] == 'V436'])
@@ -202,6 +342,11 @@ class SapProcess(SAP):
             return False
 
     def kill_sap(self):
+        if self.worker:
+            # only the session of this worker is lost, the caller stops the worker, see session_lost
+            self.session_lost = True
+            log(f"SAP not killed, worker session {self.session_ids.get(0)} is disconnected")
+            return
         from win32com.client import GetObject
         import os
         try:
@@ -209,6 +354,7 @@ class SapProcess(SAP):
             for p in WMI.ExecQuery('select * from Win32_Process where Name LIKE "%saplogon%"'):
                 os.system("taskkill /F /T /pid " + str(p.ProcessId))
                 log("SAP was killed")
+            self.reset_sessions()
 
         except Exception as e:
             log(e, lte.error)
@@ -227,11 +373,227 @@ class SapProcess(SAP):
             log(e, lte.error)
             raise Exception("Error occured in sap_exists")
     
+    def connect(self, *args, **kwargs):
+        result = super().connect(*args, **kwargs)
+        self.reset_sessions()
+        # a standby session of the previous connection is gone
+        self.standby_session_id = None
+        self.standby_ready = False
+        return result
+
+    def close_session(self, *args, **kwargs):
+        self.reset_sessions()
+        return super().close_session(*args, **kwargs)
+
+    def get_session(self, session_nr=0):
+        """
+        This function is used to get the GUI session handle for a session number.
+        The handle is fetched (and its window maximized) only on first use after a reconnect or session creation.
+
+        Parameters:
+        optional: session_nr (int): The session number.
+
+        Returns:
+        session (object): The SAP GUI session.
+        """
+        session = self.sessions.get(session_nr)
+        if session is None:
+            session_id = self.session_ids.get(session_nr)
+            if session_id is not None:
+                session = self.gui_connection.Parent.findById(session_id)
+            else:
+                session = self.gui_connection.children.ElementAt(session_nr)
+            session = self.instrument(session)
+            session.findById("wnd[0]").maximize()
+            self.sessions[session_nr] = session
+        return session
+
+    @property
+    def gui_session(self):
+        return getattr(self, '_gui_session', None)
+
+    @gui_session.setter
+    def gui_session(self, session):
+        current = getattr(self, '_gui_session', None)
+        if session is not None and current is not None and self.unwrap(current) is self.unwrap(session):
+            # keep the same handle and the cached components of the session
+            return
+        self.invalidate_elements()
+        self._gui_session = self.instrument(self.unwrap(session))
+
+    @staticmethod
+    def unwrap(gui_object):
+        """
+        This function is used to get the GUI scripting object behind the proxies of instrument.
+
+        Parameters:
+        gui_object (object): The GUI object or a proxy around it.
+
+        Returns:
+        object: The GUI object.
+        """
+        while isinstance(gui_object, (GuiActionProxy, GuiProxy, GuiRecorder)):
+            gui_object = gui_object._target
+        return gui_object
+
+    def instrument(self, gui_object):
+        """
+        This function is used to wrap a GUI scripting object, so actions which can change the screen drop the cached components,
+        and for recording and counting its calls if the GUI trace or GUI stats are enabled.
+
+        Parameters:
+        gui_object (object): The GUI object, e.g. a session.
+
+        Returns:
+        object: A GuiActionProxy around the GUI object, a GuiRecorder or a GuiProxy.
+        """
+        if gui_object is None or isinstance(gui_object, GuiActionProxy):
+            return gui_object
+        if getattr(self, 'gui_trace', None) is not None and not isinstance(gui_object, (GuiRecorder, GuiProxy)):
+            try:
+                path = str(gui_object.Id)
+            except Exception:
+                path = 'session'
+            gui_object = GuiRecorder(gui_object, self.gui_trace, path)
+        if getattr(self, 'gui_stats', None) is not None and not isinstance(gui_object, GuiProxy):
+            gui_object = GuiProxy(gui_object, self.gui_stats)
+        return GuiActionProxy(gui_object, self.invalidate_elements)
+
+    def enable_gui_stats(self):
+        """
+        This function is used to count every GUI scripting call of the run per method and calling function, see gui_stats_report.
+        """
+        session = self.unwrap(self.gui_session)
+        self.gui_stats = GuiCallStats()
+        self._gui_session = None
+        self.gui_session = session
+        self.reset_sessions()
+
+    def enable_gui_trace(self, path=None):
+        """
+        This function is used to record every GUI scripting call of the run with its result, see save_gui_trace and gui_trace.py for the replay.
+
+        Parameters:
+        optional: path (str): The trace file the calls are written to as they are recorded, kept in memory if not given.
+        """
+        session = self.unwrap(self.gui_session)
+        self.gui_trace = GuiTrace(path)
+        self._gui_session = None
+        self.gui_session = session
+        self.reset_sessions()
+        if self._gui_session is not None:
+            # SapProcess.offline of the replay reads the connection of the session first, the read is recorded for it
+            self.gui_connection = self.unwrap(self._gui_session.Parent)
+
+    def save_gui_trace(self, path=None):
+        """
+        This function is used to close the trace file, or to write the GUI calls recorded in memory to a trace file.
+
+        Parameters:
+        optional: path (str): The trace file, gzipped JSON lines, not needed if enable_gui_trace was given one.
+        """
+        if self.gui_trace is not None:
+            self.gui_trace.save(path)
+
+    def gui_stats_report(self, top=20):
+        """
+        This function is used to get the GUI scripting calls of the run.
+
+        Parameters:
+        optional: top (int): The number of most expensive (calling function, method) pairs.
+
+        Returns:
+        dict: Totals per method, totals per calling function and the most expensive pairs.
+        """
+        if self.gui_stats is None:
+            return {}
+        return {
+            'methods': self.gui_stats.totals(by='method'),
+            'functions': self.gui_stats.totals(by='caller'),
+            'top': self.gui_stats.report(top)
+        }
+
+    def reset_sessions(self):
+        """
+        This function is used to drop all GUI session handles, so they are fetched again on next use.
+        """
+        self.sessions = {}
+        self.invalidate_elements()
+
+    def find_element(self, element_id):
+        """
+        This function is used to get a GUI component by ID, reusing the resolved handle until an action can change the screen.
+        The handles are dropped by the GuiActionProxy of the session after press, sendVKey, select, double clicks and scrolling.
+
+        Parameters:
+        element_id (str): The ID of the component.
+
+        Returns:
+        element (object): The GUI component.
+        """
+        element = self.element_cache.get(element_id)
+        if element is None:
+            element = self.gui_session.findById(element_id)
+            self.element_lookups += 1
+            self.element_cache[element_id] = element
+        return element
+
+    def invalidate_elements(self):
+        """
+        This function is used to drop all cached GUI component handles.
+        """
+        self.element_cache = {}
+
+    def read_table_rows(self, table_id, columns, end_column):
+        """
+        This function is used to read a table control into memory, one visible page per scroll.
+
+        Parameters:
+        table_id (str): The ID of the table control.
+        columns (dict): Column indexes of the table keyed by the name used in the returned rows.
+        end_column (str): Name of the column which is empty or underscored after the last filled row.
+
+        Returns:
+        list: One dict per filled row with the text of the requested columns, in table order.
+        """
+        rows = []
+        self.find_element(table_id).verticalScrollbar.position = 0
+        while True:
+            table = self.find_element(table_id)
+            scrollbar = table.verticalScrollbar
+            first_visible = scrollbar.position
+            for row in range(len(rows) - first_visible, table.VisibleRowCount):
+                values = {name: str(table.GetCell(row, column).Text) for name, column in columns.items()}
+                if values[end_column] == "" or values[end_column].startswith('__'):
+                    return rows
+                rows.append(values)
+
+            next_position = min(len(rows), scrollbar.Maximum)
+            if len(rows) >= table.RowCount or next_position <= first_visible:
+                return rows
+            scrollbar.position = next_position
+
+    def scroll_table_to_row(self, table_id, row):
+        """
+        This function is used to scroll a table control so that the given absolute row is visible.
+
+        Parameters:
+        table_id (str): The ID of the table control.
+        row (int): Absolute row index.
+
+        Returns:
+        object: The table control after scrolling.
+        """
+        scrollbar = self.find_element(table_id).verticalScrollbar
+        scrollbar.position = min(row, scrollbar.Maximum)
+        return self.find_element(table_id)
+
     def logout(self):
         try:
             self.gui_connection.CloseConnection()
             self.gui_connection = None
             self.gui_session = None
+            self.reset_sessions()
 
             return True
         
@@ -239,20 +601,50 @@ class SapProcess(SAP):
             log(str(e))
             return False
         
+    def create_session(self, max_sessions):
+        """
+        This function is used to open a new session from the current one and wait until it is ready.
+        SAP GUI reuses the numbers of closed sessions, so the new session is the one whose ID was not open before, not the last one.
+
+        Parameters:
+        max_sessions (int): No session is opened if the connection has this many sessions already.
+
+        Returns:
+        object: The new GUI session, None if the limit is reached or the session has not been opened.
+        """
+        connection = self.gui_session.Parent
+        open_ids = {session.Id for session in self.connection_sessions(connection)}
+        if len(open_ids) >= max_sessions:
+            log("Max SAP sessions limit reached.")
+            return None
+        self.gui_session.createSession()
+        new_sessions = []
+
+        def session_opened():
+            new_sessions[:] = [session for session in self.connection_sessions(connection) if session.Id not in open_ids]
+            return new_sessions
+
+        if not self.wait_until(session_opened, timeout=10, name="new session"):
+            log("New SAP session has not been opened.")
+            return None
+        new_gui_session = new_sessions[0]
+        self.wait_while_busy(new_gui_session)
+
+        return new_gui_session
+
+    def connection_sessions(self, connection):
+        children = connection.Children
+        return [children(nr) for nr in range(children.Count)]
+
     def new_session(self):
         try:
-            # Get the current connection from the session
-            connection = self.gui_session.Parent
-            sessions_nr = connection.Children.count
-            # Check how many sessions are already open in this connection
-            if sessions_nr < 6:
-                # Open a new session if the maximum session limit is not reached
-                self.gui_session.createSession()
-                time.sleep(1)
-                new_gui_session = connection.Children(sessions_nr)
-            else:
-                log("Max SAP sessions limit reached.")
+            new_gui_session = self.create_session(6)
+            if new_gui_session is None:
                 return False
+            self.reset_sessions()
+            # the additional session is addressed as session number 1, see get_vendor_details
+            self.session_ids[1] = new_gui_session.Id
+            self.sessions[1] = new_gui_session
 
             return new_gui_session
         
@@ -260,11 +652,199 @@ class SapProcess(SAP):
             log(str(e))
             return False
         
+    def open_worker_sessions(self, count):
+        """
+        This function is used to open additional sessions for parallel processing next to the current one.
+
+        Parameters:
+        count (int): The number of sessions to open.
+
+        Returns:
+        list: GUI session IDs, the current session first.
+        """
+        try:
+            self.gui_session = self.get_session(0)
+            session_ids = [self.gui_session.Id]
+            for _ in range(count):
+                # keep one session free for the XK03 lookups in get_vendor_po_details
+                new_gui_session = self.create_session(5)
+                if new_gui_session is None:
+                    break
+                session_ids.append(new_gui_session.Id)
+
+            return session_ids
+
+        except Exception as e:
+            log(e, lte.error)
+            if 'The object invoked has disconnected from its clients.' in str(e):
+                self.kill_sap()
+            raise Exception(f"Error occured in function open_worker_sessions")
+
+    def close_worker_sessions(self, session_ids):
+        """
+        This function is used to close the sessions opened by open_worker_sessions, except the current one.
+
+        Parameters:
+        session_ids (list): GUI session IDs returned by open_worker_sessions.
+        """
+        self.gui_session = self.get_session(0)
+        for session_id in session_ids:
+            if session_id != self.gui_session.Id:
+                try:
+                    self.gui_connection.CloseSession(session_id)
+                except Exception as e:
+                    log(f"Session {session_id} could not be closed: {e}")
+        self.reset_sessions()
+
+    def create_worker(self, session_id):
+        """
+        This function is used to create a copy of the process which works only in the given GUI session.
+        The copy has its own caches and must be attached with attach_worker_session in the thread which uses it.
+
+        Parameters:
+        session_id (str): The GUI session ID, e.g. /app/con[0]/ses[2].
+
+        Returns:
+        SapProcess: The worker process.
+        """
+        worker = copy.copy(self)
+        worker.worker = True
+        worker.session_lost = False
+        worker.session_ids = {0: session_id}
+        # a PO is only processed by one worker, see po_groups, its snapshot is not read or dropped by the others
+        worker.po_cache = RunCache()
+        worker.reset_process_state()
+        return worker
+
+    def attach_worker_session(self):
+        """
+        This function is used to get the COM objects of the worker session in the current thread.
+        """
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        application = win32com.client.GetObject("SAPGUI").GetScriptingEngine
+        self.gui_session = application.findById(self.session_ids[0])
+        self.gui_connection = self.gui_session.Parent
+        self.reset_sessions()
+
+    def detach_worker_session(self):
+        """
+        This function is used to release the COM objects of the worker session in the current thread.
+        """
+        import pythoncom
+        self.gui_session = None
+        self.gui_connection = None
+        self.reset_sessions()
+        pythoncom.CoUninitialize()
+
+    def open_standby_session(self, cockpit):
+        """
+        This function is used to open a second session and set up the cockpit in it in the background.
+        It replaces the current session after a GUI error without a new logon, see switch_to_standby_session.
+
+        Parameters:
+        cockpit (tuple): Variant, layout and both company codes for setup_cockpit.
+
+        Returns:
+        bool: True if the session was opened, False otherwise.
+        """
+        try:
+            self.gui_session = self.get_session(0)
+            # keep one session free for the XK03 lookups in get_vendor_po_details
+            new_gui_session = self.create_session(5)
+            if new_gui_session is None:
+                log("No standby session opened.")
+                return False
+            self.standby_session_id = new_gui_session.Id
+            self.standby_ready = False
+            standby = self.create_worker(self.standby_session_id)
+            self.standby_thread = threading.Thread(target=self.prepare_standby_session, args=(standby, cockpit), name=f"SAP standby {self.standby_session_id}")
+            self.standby_thread.start()
+
+            return True
+
+        except Exception as e:
+            log(f"Error in function open_standby_session: {e}", lte.error)
+            self.standby_session_id = None
+            return False
+
+    def prepare_standby_session(self, standby, cockpit):
+        """
+        This function is used to set up the cockpit in the standby session, runs in a thread.
+
+        Parameters:
+        standby (SapProcess): The worker of the standby session, see create_worker.
+        cockpit (tuple): Variant, layout and both company codes for setup_cockpit.
+        """
+        variant_cockpit, layout_cockpit, company_code, company_code2 = cockpit
+        try:
+            standby.attach_worker_session()
+            self.standby_ready = bool(standby.setup_cockpit(variant_cockpit, layout_cockpit, company_code, pd.DataFrame(), company_code2))
+        except Exception as e:
+            log(f"Error in function prepare_standby_session: {e}", lte.error)
+        finally:
+            standby.detach_worker_session()
+
+    def switch_to_standby_session(self):
+        """
+        This function is used to close the current session and continue in the standby session.
+
+        Returns:
+        bool: True if the standby session is used now, False if there is none ready and a reconnect is needed.
+        """
+        try:
+            if self.standby_session_id is None:
+                return False
+            if self.standby_thread is not None:
+                # setting up the cockpit is still quicker than a new logon
+                self.standby_thread.join()
+                self.standby_thread = None
+            standby_session_id = self.standby_session_id
+            self.standby_session_id = None
+            if not self.standby_ready:
+                return False
+            standby_session = self.gui_connection.Parent.findById(standby_session_id)
+            try:
+                self.gui_connection.CloseSession(self.gui_session.Id)
+            except Exception as e:
+                log(f"Broken session could not be closed: {e}")
+            self.session_ids[0] = standby_session.Id
+            self.reset_sessions()
+            self.gui_session = self.get_session(0)
+            self.document_index = None
+            self.use_document_index = True
+            self.current_row = 0
+            self.current_document = None
+            log(f"Processing continues in standby session {standby_session_id}")
+
+            return True
+
+        except Exception as e:
+            log(f"Error in function switch_to_standby_session: {e}", lte.error)
+            return False
+
+    def close_standby_session(self):
+        """
+        This function is used to close the standby session if there is one.
+        """
+        try:
+            if self.standby_thread is not None:
+                self.standby_thread.join()
+                self.standby_thread = None
+            if self.standby_session_id is not None:
+                self.gui_connection.CloseSession(self.standby_session_id)
+        except Exception as e:
+            log(f"Standby session {self.standby_session_id} could not be closed: {e}")
+        self.standby_session_id = None
+        self.standby_ready = False
+
     def close_additional_session(self, session_to_close):
         try:
-            session_nr = str(session_to_close.info.SessionNumber - 1)
-            session_id = str(f"/app/con[0]/ses[{session_nr}]")
-            self.gui_connection.CloseSession(session_id)
+            # the number of a session is not its position, closed numbers are used again
+            self.gui_connection.CloseSession(session_to_close.Id)
+            self.sessions.pop(1, None)
+            self.session_ids.pop(1, None)
             session_to_close = None
 
             return True
@@ -299,6 +879,8 @@ class SapProcess(SAP):
         Note: This method does not return any value.
         """
         try:
+            self.document_index = None
+            self.use_document_index = True
             self.open_transaction("/n/cockpit/1")
             self.gui_session.findById("wnd[0]/tbar[1]/btn[17]").press()
             self.gui_session.findById("wnd[1]/usr/txtV-LOW").text = variant_cockpit
@@ -377,9 +959,9 @@ class SapProcess(SAP):
 
                 self.import_docs_from_file(path_attachments)
                 log(f"Documents from {path_attachments} imported")
-                self.generate_export_file(temp_path, file_name)
+                export_file = self.generate_export_file(temp_path, file_name)
                 log(f"Export file {file_name} generated")
-                df = pd.read_excel(os.path.join(temp_path, file_name))
+                df = self.excel.read_export(export_file)
 
                 return df
             
@@ -387,9 +969,9 @@ class SapProcess(SAP):
                 self.exclude_credit_notes_prepare_kpi()
                 log("credit notes excluded")
                 file_name_comp_code = f'Export{company_code}.xlsx'
-                self.generate_export_file(temp_path, file_name_comp_code)
+                export_file = self.generate_export_file(temp_path, file_name_comp_code)
                 log(f"Export file {file_name_comp_code} generated")
-                df = pd.read_excel(os.path.join(temp_path, file_name_comp_code))
+                df = self.excel.read_export(export_file)
                 df = df.where(df.notna(), '')
                 if not df.empty:
                     df_processable_docs = pd.concat([df_processable_docs, df]) if not df_processable_docs.empty else df
@@ -541,31 +1123,44 @@ class SapProcess(SAP):
 
         Parameters:
         katalog (str): The path to the folder where the file will be saved.
-        file_name (str): The name of the file to be generated.
+        file_name (str): The name of the file to be generated, the extension is '.txt' in the text export format.
 
         Returns:
-        Bool: True if the operation was successful, False otherwise.
+        str: The path of the export file once it is completely written, False otherwise.
         """
         try:
+            text_export = self.export_format == 'text'
+            if text_export:
+                file_name = os.path.splitext(file_name)[0] + '.txt'
+            else:
+                # Excel instances which are not opened by this export
+                excel_pids = self.excel.excel_pids()
+
             # Trigger export in SAP GUI
             shell = self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell")
             shell.pressToolbarContextButton("&MB_EXPORT")
-            shell.selectContextMenuItem("&XXL")
-            self.gui_session.findById("wnd[1]/tbar[0]/btn[0]").press()
+            if text_export:
+                # local file, text with tabs in UTF-8, no Excel is started
+                shell.selectContextMenuItem("&PC")
+                self.gui_session.findById("wnd[1]/usr/subSUBSCREEN_STEPLOOP:SAPLSPO5:0150/sub:SAPLSPO5:0150/radSPOPLI-SELFLAG[1,0]").select()
+                self.gui_session.findById("wnd[1]/tbar[0]/btn[0]").press()
+                self.gui_session.findById("wnd[1]/usr/ctxtDY_FILE_ENCODING").text = "4110"
+            else:
+                shell.selectContextMenuItem("&XXL")
+                self.gui_session.findById("wnd[1]/tbar[0]/btn[0]").press()
             self.gui_session.findById("wnd[1]/usr/ctxtDY_PATH").text = str(katalog)
             self.gui_session.findById("wnd[1]/usr/ctxtDY_FILENAME").text = file_name
             self.gui_session.findById("wnd[1]/tbar[0]/btn[11]").press()
 
-            # Wait for the export file to appear
-            stop_time = datetime.now() + timedelta(seconds=30)
+            # Wait for the export file to be written
             export_file = os.path.join(katalog, file_name)
-
-            while datetime.now() < stop_time:
-                if os.path.isfile(export_file):
-                    self.excel.close_excel()
-                    break
-                time.sleep(1)
-            return True
+            if not self.wait_for_file(export_file, timeout=30, name="export file"):
+                log(f"Export file {export_file} not written", lte.error)
+                return False
+            # SAP opens the export in a new Excel, it is closed without touching the others
+            if not text_export and self.wait_until(lambda: self.excel.excel_pids() - excel_pids, timeout=3, name="export excel", max_interval=0.1):
+                self.excel.close_excel(self.excel.excel_pids() - excel_pids)
+            return export_file
 
         except Exception as e:
             log(f"Error in procedure 'generate_export_file': {str(e)}")
@@ -620,34 +1215,34 @@ class SapProcess(SAP):
             self.gui_session.findById("wnd[1]/tbar[0]/btn[0]").press()
             self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").clearSelection()
             file_name = "Export2.xlsx"
-            self.generate_export_file(katalog, file_name)
-            df = pd.read_excel(os.path.join(katalog, file_name))
-            df = self.filter_dates(katalog, file_name, dates)
+            export_file = self.generate_export_file(katalog, file_name)
+            df = self.excel.read_export(export_file)
+            df = self.filter_dates(df, dates)
             file_name = self.prepare_process_list(katalog, df)
             return file_name
         except Exception as e:
             log(f"Error in function 'get_procesable_documents': {str(e)}")
             return False
 
-    def filter_dates(self, katalog, file_name, dates):
+    def filter_dates(self, df, dates):
         """
-        This function is used to filter dates in a given Excel file.
+        This function is used to filter the documents of a cockpit export by their creation date.
 
         Parameters:
-        katalog (str): The directory where the file is located.
-        file_name (str): The name of the Excel file to be filtered.
+        df (DataFrame): The cockpit export, see ExcelProcess.read_export.
         dates (list): A list of dates to be used for filtering.
 
         Returns:
         df (DataFrame): A pandas DataFrame after filtering the dates.
         """
         try:
-            # Filter the data
-            df = pd.read_excel(os.path.join(katalog, file_name))
+            # Filter the data on whole days
+            creation_dates = pd.to_datetime(df['Creation date'], errors='coerce').dt.normalize()
+            days = [pd.Timestamp(date).normalize() for date in dates]
             if len(dates) == 2:
-                df = df[(df['Creation date'].dt.strftime('%Y-%m-%d') != dates[1].strftime('%Y-%m-%d')) & (df['Creation date'].dt.strftime('%Y-%m-%d') != dates[0].strftime('%Y-%m-%d'))]
+                df = df[~creation_dates.isin(days)]
             else:
-                df = df[(df['Creation date'].dt.strftime('%Y-%m-%d') == dates[0].strftime('%Y-%m-%d'))]
+                df = df[creation_dates == days[0]]
             return df
         except Exception as e:
             log(f"Error in procedure 'filter_dates': {str(e)}")
@@ -659,13 +1254,52 @@ class SapProcess(SAP):
 
         Parameters:
         doc_number (str): The document number.
+        company_code (str): The company code.
 
         Returns:
         Bool: True if the invoice was successfully opened, False otherwise.
         """
         try:
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
+            self.current_document = (doc_number, company_code)
+            if self.use_document_index:
+                try:
+                    row = self.locate_document(doc_number, company_code)
+                except Exception as e:
+                    # e.g. DOCNO or COMP_CODE missing in the layout, filter the list for the rest of the run
+                    log(f"Cockpit document index not available, using filters: {e}")
+                    self.use_document_index = False
+                    self.document_index = None
+                else:
+                    if row is None:
+                        return False
+                    self.current_row = row
+                    self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectedRows = str(row)
+                    return True
+
+            self.filter_invoice(doc_number, company_code)
+            self.current_row = 0
+            try:
+                self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectedRows = "0"
+            except:
+                return False
+            return True
+        
+        except Exception as e:
+            log(f"Error in function find_invoice. Doc number {doc_number}: {e}", lte.error)
+            if 'The object invoked has disconnected from its clients.' in str(e):
+                self.kill_sap()
+            return str(f"Error in function find_invoice. Doc number {doc_number}: {e}")
+
+    def filter_invoice(self, doc_number, company_code):
+        """
+        This function is used to filter the cockpit list down to one document with the DOCNO and COMP_CODE filters.
+
+        Parameters:
+        doc_number (str): The document number.
+        company_code (str): The company code.
+        """
+        try:
             # filter by document number
             self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").setCurrentCell(-1, "DOCNO")
             self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectColumn("DOCNO")
@@ -674,7 +1308,7 @@ class SapProcess(SAP):
             self.gui_session.findById("wnd[1]/usr/ssub%_SUBSCREEN_FREESEL:SAPLSSEL:1105/btn%_%%DYN001_%_APP_%-VALU_PUSH").press()
             self.gui_session.findById("wnd[2]").sendVKey(16)
             self.gui_session.findById("wnd[2]/usr/tabsTAB_STRIP/tabpSIVA/ssubSCREEN_HEADER:SAPLALDB:3010/tblSAPLALDBSINGLE/ctxtRSCSEL_255-SLOW_I[1,0]").text = doc_number # '01010101'
-            time.sleep(1)
+            self.wait_while_busy()
             self.gui_session.findById("wnd[2]/tbar[0]/btn[8]").press()
             self.gui_session.findById("wnd[1]").sendVKey(0)
             # filter by company code
@@ -684,28 +1318,158 @@ class SapProcess(SAP):
             self.gui_session.findById("wnd[1]/usr/ssub%_SUBSCREEN_FREESEL:SAPLSSEL:1105/btn%_%%DYN002_%_APP_%-VALU_PUSH").press()
             self.gui_session.findById("wnd[2]").sendVKey(16)
             self.gui_session.findById("wnd[2]/usr/tabsTAB_STRIP/tabpSIVA/ssubSCREEN_HEADER:SAPLALDB:3010/tblSAPLALDBSINGLE/ctxtRSCSEL_255-SLOW_I[1,0]").text = company_code
-            time.sleep(1)
+            self.wait_while_busy()
             self.gui_session.findById("wnd[2]/tbar[0]/btn[8]").press()
             self.gui_session.findById("wnd[1]").sendVKey(0)
-            
-            try:
-                self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectedRows = "0"
-            except:
-                return False
-            return True
-        
+
         except Exception as e:
-            log(f"Error in function find_invoice. Doc number {doc_number}: {e}", lte.error)
+            log(e, lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
                 self.kill_sap()
-            return str(f"Error in function find_invoice. Doc number {doc_number}: {e}")
+            raise Exception(f"Error occured in function filter_invoice")
+
+    def build_document_index(self):
+        """
+        This function is used to read DOCNO and COMP_CODE of every cockpit list row once, page by page.
+
+        Returns:
+        dict: Grid row per (document number, company code).
+        """
+        grid = self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell")
+        row_count = grid.RowCount
+        page = max(grid.VisibleRowCount, 1)
+        index = {}
+        for first_row in range(0, row_count, page):
+            # rows of an ALV grid are only loaded to the frontend once they were scrolled into view
+            grid.firstVisibleRow = first_row
+            for row in range(first_row, min(first_row + page, row_count)):
+                key = document_key(grid.getCellValue(row, "DOCNO"), grid.getCellValue(row, "COMP_CODE"))
+                index.setdefault(key, row)
+        self.document_index = index
+        self.document_index_rows = row_count
+        return index
+
+    def locate_document(self, doc_number, company_code):
+        """
+        This function is used to make the cockpit list row of a document the current cell.
+        The index is rebuilt when the list was refreshed, i.e. the row count changed or the row holds another document.
+
+        Parameters:
+        doc_number (str): The document number.
+        company_code (str): The company code.
+
+        Returns:
+        int: The grid row, None if the document is not in the cockpit list.
+        """
+        key = document_key(doc_number, company_code)
+        grid = self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell")
+        index = self.document_index
+        if index is None or grid.RowCount != self.document_index_rows:
+            index = self.build_document_index()
+
+        for attempt in range(2):
+            row = index.get(key)
+            if row is not None:
+                grid.setCurrentCell(row, "DOCNO")
+                if document_key(grid.getCellValue(row, "DOCNO"), grid.getCellValue(row, "COMP_CODE")) == key:
+                    return row
+            if attempt == 0:
+                index = self.build_document_index()
+        return None
+
+    def build_meta_data_index(self, df=pd.DataFrame):
+        """
+        This function is used to build the metadata of all documents from the cockpit export at once,
+        instead of reading it from the cockpit list for every document in get_meta_data.
+
+        Parameters:
+        df (DataFrame): The cockpit export, as returned by get_data_for_process.
+
+        Returns:
+        dict: metaData per document_key, empty if the export misses one of the metadata columns.
+        """
+        try:
+            # metaData field, export column headers (layout texts or technical names)
+            metaData_columns = [
+                ('Document number', ['Document Number', 'Doc. Number', 'DOCNO']),
+                ('Company code', ['Company Code', 'CoCd', 'COMP_CODE']),
+                ('WFDescription', ['Workflow Description', 'WC Name', 'Work Cycle', 'WC_NAME']),
+                ('WFstatus', ['Workflow Status', 'WF Status', 'WC Status', 'WC_ICON']),
+                ('DocType_MM_FI', ['FI/MM', 'FI/MM Flag', 'FI_MM_FLG']),
+                ('followUpFlag', ['Follow-Up', 'Follow-Up Flag', 'FOLLOW_UP_ICON'])
+            ]
+            if df.empty:
+                return {}
+
+            headers = {str(column).strip().lower(): column for column in df.columns}
+            columns = {}
+            for field_name, candidates in metaData_columns:
+                # only by header, a column taken by position could hold other values than get_meta_data reads
+                column = next((headers[c.lower()] for c in candidates if c.lower() in headers), None)
+                if column is None:
+                    log(f"Column for {field_name} not found in the cockpit export, metadata will be read from the cockpit list")
+                    return {}
+                columns[field_name] = column
+
+            meta_data_index = {}
+            for record in df[list(columns.values())].itertuples(index=False, name=None):
+                values = {field_name: ('' if pd.isna(value) else value) for field_name, value in zip(columns, record)}
+                doc_number = values.pop('Document number')
+                meta_data_index[document_key(doc_number, values['Company code'])] = values
+
+            return meta_data_index
+
+        except Exception as e:
+            log(f"Error in function build_meta_data_index: {e}", lte.error)
+            return {}
+
+    def po_groups(self, df, indexes):
+        """
+        This function is used to group the documents of the process list by their PO number for parallel processing,
+        all documents of a PO go to the same worker, so two workers never check and post against the same PO.
+
+        Parameters:
+        df (DataFrame): The process list, as returned by get_data_for_process.
+        indexes (list): The indexes of the documents to process.
+
+        Returns:
+        list: Lists of indexes per PO number, documents without a PO number in one list, all documents in one list if the export has no PO column.
+        """
+        try:
+            headers = {str(column).strip().lower(): column for column in df.columns}
+            column = next((headers[c.lower()] for c in ['Purchasing Document', 'Purchase Order', 'PO Number', 'Purch.Doc.', 'PO_NUMBER'] if c.lower() in headers), None)
+            if column is None:
+                log("Column for PO number not found in the cockpit export, documents will be processed in one session")
+                return [list(indexes)] if len(indexes) else []
+
+            groups = {}
+            for index in indexes:
+                po_number = df.at[index, column]
+                groups.setdefault('' if pd.isna(po_number) else str(po_number).strip(), []).append(index)
+            return list(groups.values())
+
+        except Exception as e:
+            log(f"Error in function po_groups: {e}", lte.error)
+            return [list(indexes)] if len(indexes) else []
+
+    def is_wf_status_supported(self, metaData, unsupported_wf_statuses=None):
+        """
+        This function is used to check the workflow status of a document before it is opened in SAP.
+
+        Parameters:
+        metaData (dict): The metadata of the document.
+        unsupported_wf_statuses (list): Workflow statuses which are not processed by the robot.
+
+        Returns:
+        Bool: False if the workflow status is one of the unsupported ones, True otherwise.
+        """
+        wf_status = str(metaData.get('WFstatus', '')).strip().lower()
+        # whole values, an unsupported 'Approved' must not block 'Not approved'
+        return wf_status == '' or wf_status not in {str(status).strip().lower() for status in unsupported_wf_statuses or []}
 
     def get_meta_data(self, doc_number):
         try:
-            line = self.line_numb()
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
-            line = self.line_numb()
+            self.gui_session = self.get_session(0)
             
             metaData_fields = [
                 ('WFDescription', "WC_NAME"),
@@ -719,13 +1483,13 @@ class SapProcess(SAP):
             field_path = 'wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell'
 
             for field_name, field_Id in metaData_fields:
-                value = self.gui_session.findById(field_path).getCellValue(0, field_Id)
+                value = self.gui_session.findById(field_path).getCellValue(self.current_row, field_Id)
                 updated_metaData_fields[field_name] = value
 
             return updated_metaData_fields
         
         except Exception as e:
-            log(f"Error in function get_meta_data. Doc number {doc_number}: {e} Line: {line}", lte.error)
+            log(f"Error in function get_meta_data. Doc number {doc_number}: {e} Line: {self.error_line(e)}", lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
                 self.kill_sap()
             return str(f"Error in function get_meta_data. Doc number {doc_number}: {e}")
@@ -769,7 +1533,7 @@ class SapProcess(SAP):
         """
         try:
             try:
-                self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectedRows = "0"
+                self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").selectedRows = str(self.current_row)
             except:
                 return False
             self.gui_session.findById("wnd[0]/tbar[1]/btn[8]").press()
@@ -816,7 +1580,7 @@ class SapProcess(SAP):
                 elif given_po == '':
                     screen_id = self.find_screen_id()
                     self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").Select()
-                    given_po = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text = ""
+                    given_po = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text = ""
                     if given_po == '':
                         info = f"Document {doc_number} cannot be processed, PO number was not found either on the tab 'Notes' or in the PO filled on tab 'General'"
                         return info
@@ -969,7 +1733,7 @@ class SapProcess(SAP):
             wf_status = metaData['WFstatus']
             screen_id = self.find_screen_id()
             if 'accepted' in str(wf_status).lower() and 'transp.inv. price diff' in str(wf_status).lower():
-                saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
                 if self.convert_to_number(saldo) == 0.00: 
                     return "go to final steps"
 
@@ -1018,7 +1782,7 @@ class SapProcess(SAP):
                 if not self.take_over_document(doc_number):
                     return f"Document {doc_number} cannot be processed. Error during taking over the document"
                 screen_id = self.find_screen_id()
-                saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
                 self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0381/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2").Select()
                 net = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-NET_AMOUNT").text
 
@@ -1072,39 +1836,64 @@ class SapProcess(SAP):
 
             screen_id = self.find_screen_id(type=6, tab=1)
             po_number = self.check_given_po(doc_number, given_po)
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
-            self.gui_session.findById("wnd[0]").sendVKey(2)
+            po_snapshot = self.get_po_snapshot(po_number)
+            snapshot_fields = ['po_line_details', 'po_totals', 'po_creator']
+            if type in {1, 3}:
+                snapshot_fields.append('gr_based')
+            if type in {2, 3}:
+                snapshot_fields.append('tax_code')
+
+            if all(field in po_snapshot for field in snapshot_fields):
+                po_line_details = po_snapshot['po_line_details']
+                po_totals = po_snapshot['po_totals']
+                po_creator = po_snapshot['po_creator']
+                if type in {1, 3}:
+                    gr_based = po_snapshot['gr_based']
+                    two_way_match = False if gr_based else True
+                if type in {2, 3}:
+                    tax_code = po_snapshot['tax_code']
+            else:
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
+                self.gui_session.findById("wnd[0]").sendVKey(2)
 
-            screen_id = self.find_screen_id(type=1)          
-            po_line_details = self.get_po_line_details(doc_number, screen_id)
-            
-            # Ariba
-            if type in {1, 3}:    # GR_based - TRUE, 
-                gr_based = self.get_gr_based(doc_number)
-                if not isinstance(gr_based, bool):
-                    return gr_based
-                two_way_match = False if gr_based else True
-
-            # PDF Collector
-            if type in {2, 3}:    # GR_based - FALSE, get_totals - TRUE
-                tax_code = self.get_tax_code(doc_number)
-                if 'cannot be processed' in tax_code:
-                    return tax_code
+                screen_id = self.find_screen_id(type=1)          
+                po_line_details = self.get_po_line_details(doc_number, screen_id)
                 
-            screen_id = self.find_screen_id(type=2, tab=9)
-            po_totals = self.get_po_totals(doc_number)
-            if po_number[:2] != '40':
-                po_creator = self.get_po_creator(doc_number, po_number)
-            else:
-                po_creator = 'Missing'
-            self.gui_session.findById("wnd[0]").sendVKey(3)
+                # Ariba
+                if type in {1, 3}:    # GR_based - TRUE, 
+                    gr_based = self.get_gr_based(doc_number)
+                    if not isinstance(gr_based, bool):
+                        return gr_based
+                    two_way_match = False if gr_based else True
+
+                # PDF Collector
+                if type in {2, 3}:    # GR_based - FALSE, get_totals - TRUE
+                    tax_code = self.get_tax_code(doc_number)
+                    if 'cannot be processed' in tax_code:
+                        return tax_code
+                    
+                screen_id = self.find_screen_id(type=2, tab=9)
+                po_totals = self.get_po_totals(doc_number)
+                if po_number[:2] != '40':
+                    po_creator = self.get_po_creator(doc_number, po_number)
+                else:
+                    po_creator = 'Missing'
+                self.gui_session.findById("wnd[0]").sendVKey(3)
+
+                if not isinstance(po_line_details, str) and not isinstance(po_totals, str) and not str(po_creator).startswith('Error'):
+                    snapshot = {'po_line_details': po_line_details, 'po_totals': po_totals, 'po_creator': po_creator}
+                    if type in {1, 3}:
+                        snapshot['gr_based'] = gr_based
+                    if type in {2, 3}:
+                        snapshot['tax_code'] = tax_code
+                    self.update_po_snapshot(po_number, snapshot)
 
             vendor = self.get_vendor(doc_number)
             if vendor == '':
                 return f"Document {doc_number}, cannot be processed. No Vendor account was assigned"
             netto = self.get_netto(doc_number)
             screen_id = self.find_screen_id()
-            saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+            saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
 
             if type in {1, 2, 3}:  # GR_based - TRUE or get_totals - TRUE
                 process_standard_result = {
@@ -1131,6 +1920,43 @@ class SapProcess(SAP):
                 self.kill_sap()
             return str(f"Error in function process_standard_po. Doc number {doc_number}: {e}")
 
+    def get_po_snapshot(self, po_number):
+        """
+        This function is used to get the PO data read for earlier invoices of the run.
+
+        Parameters:
+        po_number (str): The PO number.
+
+        Returns:
+        dict: PO fields read so far, empty if the PO has not been opened in this run or was posted against since.
+        """
+        po_number = str(po_number).strip()
+        if po_number == '':
+            return {}
+        self.document_po_numbers.add(po_number)
+        return self.po_cache.get(po_number) or {}
+
+    def update_po_snapshot(self, po_number, fields):
+        """
+        This function is used to add fields read from a PO to its snapshot.
+
+        Parameters:
+        po_number (str): The PO number.
+        fields (dict): The PO fields.
+        """
+        po_number = str(po_number).strip()
+        if po_number != '':
+            self.document_po_numbers.add(po_number)
+            self.po_cache.update(po_number, fields)
+
+    def invalidate_po_snapshots(self):
+        """
+        This function is used to drop the snapshots of the POs used by the current document, e.g. after posting.
+        """
+        for po_number in self.document_po_numbers:
+            self.po_cache.invalidate(po_number)
+        self.document_po_numbers = set()
+
     def check_given_po(self, doc_number, given_po):
         """
         This function is used to enter given PO to system if founded.
@@ -1144,8 +1970,8 @@ class SapProcess(SAP):
         try:
             screen_id = self.find_screen_id()
             if given_po != "":
-                self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text = given_po
-            po_number = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text = given_po
+            po_number = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text
 
             return po_number
 
@@ -1240,12 +2066,10 @@ class SapProcess(SAP):
         screen_id (str): The screen id.
 
         Returns:
-        list: nested list with PO Lines values.
+        tuple: (bool, list) whether the PO has more than one line and a dict per PO line.
         """
         try:
 
-            po_line_details = []
-            b, c = 0, 0
             path = f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-EBELP[1,0]"
             if self.gui_session.findById(path, False) is None:
                 middle_path = "subSUB2:SAPLMEVIEWS:1100/subSUB1:SAPLMEVIEWS:4001/btnDYN_4000-BUTTON"
@@ -1253,31 +2077,14 @@ class SapProcess(SAP):
                 self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id_button}/subSUB2:SAPLMEVIEWS:1100/subSUB1:SAPLMEVIEWS:4001/btnDYN_4000-BUTTON").press()
 
             screen_id = self.find_screen_id(type=1)
-            how_many_rows = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/").RowCount
-            how_many_rows = how_many_rows - 1
-            visible_row_count = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/").VisibleRowCount
-            scroll_row = 1 # how_many_rows % visible_row_count
-            while True:
-                po_line_item = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-EBELP[1,{c}]").text
-
-                po_line_qty = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-MENGE[6,{c}]").text
-                po_line_net_price = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-NETPR[10,{c}]").text
-                po_line_order_unit = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/ctxtMEPO1211-MEINS[7,{c}]").text
-                po_line_price_unit = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-PEINH[12,{c}]").text
-
-                po_line_details.append({'item': po_line_item, 'qty': po_line_qty, 'net_price': po_line_net_price, 'order_unit': po_line_order_unit, 'price_unit': po_line_price_unit})
-                b += 1
-                
-                po_line_item = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-EBELP[1,{c + 1}]").text
-                if po_line_item == '':
-                    break
-                c += 1
-
-                if c == scroll_row:
-                    # Adjust scrollbar position
-                    scroll_path = f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211"
-                    self.gui_session.findById(scroll_path).verticalScrollbar.position = b
-                    c = 0
+            table_id = f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211"
+            # EBELP[1], MEINS[7], MENGE[6], NETPR[10], PEINH[12]
+            columns = {'item': 1, 'qty': 6, 'net_price': 10, 'order_unit': 7, 'price_unit': 12}
+            po_line_details = self.read_table_rows(table_id, columns, 'item')
+            if not po_line_details:
+                # the first row is taken even without an item number, as the former cell by cell read did
+                table = self.find_element(table_id)
+                po_line_details = [{name: str(table.GetCell(0, column).Text) for name, column in columns.items()}]
             
             more_than_one_line = False
             if len(po_line_details) > 1:
@@ -1535,9 +2342,9 @@ class SapProcess(SAP):
                         self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_INSERT").press()
                         self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/{mid_path}ctxt/COCKPIT/SITEM_DISP-PO_ITEM[3,0]").text = item.get('item')
                         self.gui_session.findById("wnd[0]").sendVKey(0)
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").columns.elementAt(3).selected = True
+                    self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").columns.elementAt(3).selected = True
                     self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btn%#AUTOTEXT001").press()
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").deselectAllColumns()
+                    self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").deselectAllColumns()
                     i = 1
                     for item in po_line_details:
                         self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-INVOICE_ITEM[1,{i - 1}]").text = i
@@ -1702,8 +2509,7 @@ class SapProcess(SAP):
         bool: True if the document is an invoice or if subsequent debit change it to invoice, else info message
         """
         try:
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             screen_id = self.find_screen_id()
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").Select()
             screen_id = self.find_screen_id()
@@ -1776,7 +2582,7 @@ class SapProcess(SAP):
                         return info
 
                     screen_id = self.find_screen_id(type=6, tab=1)
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
+                    self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
                     self.gui_session.findById("wnd[0]").sendVKey(2)
                     gr_based = self.get_gr_based(doc_number)
                     if not isinstance(gr_based, bool):
@@ -1794,7 +2600,7 @@ class SapProcess(SAP):
                             info = self.enter_data(doc_number, process_data)
                             self.gui_session.findById("wnd[0]").sendVKey(0)
                             screen_id = self.find_screen_id()
-                            saldo = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
+                            saldo = self.convert_to_number(self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
                             if saldo == 0:
                                 info = "go to final steps"
                                 return info
@@ -1829,11 +2635,8 @@ class SapProcess(SAP):
                 
     def check_po_lines(self, entry_data):
         try:
-            a = 0
-            b = 0
             previous_nr_inv = ''
             number_inv = ''
-            current_po = ''
             previous_po = ''
             list_lenght = 7
             hits = 0
@@ -1841,67 +2644,48 @@ class SapProcess(SAP):
             ktory = ktory3 = 0
 
             screen_id = self.find_screen_id()
-            # Set scrollbar position to start
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = 0
+            item_area_id = f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410"
+            table_id = f"{item_area_id}/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET"
+            # read the whole item table once, the rules below work on the snapshot
+            lines = self.read_table_rows(table_id, {'invoice_item': 1, 'po_number': 2, 'amount': 4, 'tax_code': 10}, 'amount')
 
-            while True:
+            for a, line in enumerate(lines):
                 if a > 0 and a % list_lenght == 0:
-                    # Scroll down after processing a batch
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = a
-                    b = 0
+                    # first line of the next page of list_lenght lines, as the cockpit shows them
+                    number_inv = line['invoice_item']
 
-                    number_inv = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-INVOICE_ITEM[1,{b}]").text
-                    po_number = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/ctxt/COCKPIT/SITEM_DISP-PO_NUMBER[2,{b}]").text
-                    
-                    if '____' in po_number:
-                        break
-                    
                     # If the same PO line as before, accumulate amount [sum_po_lines]
                     if previous_nr_inv == number_inv:
-                        value = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text)
-                        entry_data['sum_po_lines'] += value
+                        entry_data['sum_po_lines'] += self.convert_to_number(line['amount'])
 
                         if entry_data['rule_5'] and hits == 1:
-                            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = ktory - (ktory % list_lenght)
-                            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_MARK_ALL").press()
-                            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(ktory - 1).Selected = False
-                            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_DELETE").press()
+                            self.find_element(f"{item_area_id}/btnG_TC_ITEM_DET_MARK_ALL").press()
+                            self.scroll_table_to_row(table_id, ktory - 1).getAbsoluteRow(ktory - 1).Selected = False
+                            self.find_element(f"{item_area_id}/btnG_TC_ITEM_DET_DELETE").press()
                             entry_data['crop_result'] = True
-                        return True, entry_data  
-                
+                        return True, entry_data
+
                 # Handle multiple POs [different_pos]
                 if entry_data['different_pos']:
-                    current_po = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/ctxt/COCKPIT/SITEM_DISP-PO_NUMBER[2,{b}]").text
+                    current_po = line['po_number']
                     if previous_po and previous_po != current_po and '____' not in current_po:
                         entry_data['multiple_pos_exist'] = True
                         if entry_data['multiple_only']:
                             return False, entry_data  # Exit if only multiple PO detection was needed
-                
+                    previous_po = current_po
+
                 # Check tax codes if required [tax_code_missing]
-                if entry_data['tax_code_missing']:
-                    taxCode = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/ctxt/COCKPIT/SITEM_DISP-TAX_CODE[10,{b}]").text
-                    if not taxCode:
-                        entry_data['missing_tax_codes'] += f"Tax code missing on line {a + 1}.\n"
+                if entry_data['tax_code_missing'] and not line['tax_code']:
+                    entry_data['missing_tax_codes'] += f"Tax code missing on line {a + 1}.\n"
 
-                # Store previous values for comparison in next loop iteration [different_pos]
+                # Store previous values for comparison on the next page [sum_po_lines]
                 previous_nr_inv = number_inv
 
-                if entry_data['different_pos']:
-                    previous_po = current_po
-                
-                # Check for end condition (empty or invalid text)
-                text = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,{b}]").text
-                if text.startswith('__') or text == "":
-                    break
-                else:
-                    entry_data['how_many_lines'] += 1
+                entry_data['how_many_lines'] += 1
 
                 # Process Rule 5 logic [rule_5]
                 if entry_data['rule_5']:
-                    if b >= 1:
-                        value = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,{b}]").text)
-                    else:
-                        value = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text)
+                    value = self.convert_to_number(line['amount'])
                     entry_data['value'] = value
                     if value == entry_data['searched_amount']:
                         hits += 1
@@ -1910,30 +2694,22 @@ class SapProcess(SAP):
                         hits_crop += 1
                         ktory3 = a + 1
 
-                a += 1
-                b += 1
-
             # Check tax codes if required [tax_code_missing]
             if entry_data['tax_code_missing']:
                 return True, entry_data
-            
-            if b >= 1:
-                entry_data['value'] = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,{b - 1}]").text)
-            else:
-                entry_data['value'] = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text)
-            
+
+            entry_data['value'] = self.convert_to_number(lines[-1]['amount']) if lines else 0.0
+
             # Final Rule 5 processing if needed [rule_5]
             if entry_data['rule_5']:
                 if hits == 1:
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/tbl/COCKPIT/SITEM_DISP").verticalScrollbar.position = ktory - (ktory % list_lenght)
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP-MARK_ALL").press()
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP").getAbsoluteRow(ktory - 1).Selected = False
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP-DELETE").press()
+                    self.find_element(f"{item_area_id}/btnG_TC_ITEM_DET_MARK_ALL").press()
+                    self.scroll_table_to_row(table_id, ktory - 1).getAbsoluteRow(ktory - 1).Selected = False
+                    self.find_element(f"{item_area_id}/btnG_TC_ITEM_DET_DELETE").press()
                     entry_data['crop_result'] = True
                 elif hits_crop == 1:
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP").verticalScrollbar.position = ktory3 - (ktory3 % list_lenght)
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP").getAbsoluteRow(ktory3 - 1).Selected = True
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SITEM_DISP-DELETE").press()
+                    self.scroll_table_to_row(table_id, ktory3 - 1).getAbsoluteRow(ktory3 - 1).Selected = True
+                    self.find_element(f"{item_area_id}/btnG_TC_ITEM_DET_DELETE").press()
                     entry_data['crop_result'] = True
 
             return True, entry_data
@@ -1972,23 +2748,8 @@ class SapProcess(SAP):
     def is_vendor_critical(self, vendor, comp_code, doc_number):
         '''This function is used to check if a vendor is critical.'''
         try:
-            
-            if comp_code == '3B5':
-                df_critical_vendors3B5 = pd.read_excel('critical suppliers.xlsx', sheet_name='AM France 3b5', usecols="A", skiprows=3, engine="openpyxl")
-                df_critical_vendor3B5 = df_critical_vendors3B5.loc[df_critical_vendors3B5['Vendor  ACE'] == vendor, 'Vendor  ACE']
-                if not df_critical_vendor3B5.empty:
-                    return True
-            
-            if comp_code == 'V436':
-                df = pd.read_excel('critical suppliers.xlsx', sheet_name='AMMED v436', usecols="B,F,G", skiprows=3, engine="openpyxl")
-                df = df.loc[df['Vendor number ACE'] == vendor]
-                df_critical_vendorV436 = df.iloc[:, 0]
-                # df_amei = df.iloc[:, 1]
-                # df_enames = df.iloc[:, 2]
-                if not df_critical_vendorV436.empty:
-                    return True 
-
-            return False
+            # 'critical suppliers.xlsx' is indexed once per run, see ExcelProcess.load_reference_data
+            return self.excel.is_vendor_critical(vendor, comp_code)
 
         except Exception as e:
             log(e, lte.error)
@@ -1996,12 +2757,10 @@ class SapProcess(SAP):
 
     def check_fi_vendors_v436(self, doc_number, vendor):
         try:
-            df_ammed_fi = pd.read_excel('AMMED FI Fournisseurs.xlsx', sheet_name='UPDATE FOS FI', usecols="A:B", engine="openpyxl")
-            df_fi_vendorsV436 = df_ammed_fi[['Vendor', 'Cir.code']]
-            cir_code = df_fi_vendorsV436.loc[df_fi_vendorsV436['Vendor'] == vendor, 'Cir.code']
+            cir_code = self.excel.get_cir_code(vendor)
 
-            if not cir_code.empty:
-                info = self.transfer_mm_to_fi(cir_code)
+            if cir_code is not None:
+                info = self.transfer_mm_to_fi(doc_number, cir_code)
                 if info != True:                    
                     return info
                 else:
@@ -2056,7 +2815,15 @@ class SapProcess(SAP):
                 info = f"'Purchase order' change sub. debit - {sap_status_bar_msg}" 
                 return f"Document {doc_number} cannot be processed. SAP info: {info}"
             
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
+            po_number = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text
+            po_type_text = self.get_po_snapshot(po_number).get('po_type_text')
+            if po_type_text is not None:
+                self.find_screen_id(type=6, tab=2)
+                if po_type_text in acceptable:
+                    return True, po_types[min(acceptable.index(po_type_text), 3)]
+                return False
+
+            self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
             self.gui_session.findById("wnd[0]").sendVKey(2)
             
             if self.gui_session.findById("wnd[0]/sbar").messagetype == "E":
@@ -2071,6 +2838,7 @@ class SapProcess(SAP):
 
             screen_id = self.find_screen_id(type=7)
             po_type_text = str(self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB0:SAPLMEGUI:0030/subSUB1:SAPLMEGUI:1105/cmbMEPO_TOPLINE-BSART").text).strip()
+            self.update_po_snapshot(po_number, {'po_type_text': po_type_text})
 
             if po_type_text in acceptable:
                 self.gui_session.findById("wnd[0]").sendVKey(3)
@@ -2103,14 +2871,10 @@ class SapProcess(SAP):
         bool: True if the proposal is valid, info message otherwise.
         """
         try:
-            line = self.line_numb()
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             screen_id = self.find_screen_id()
-            line = self.line_numb()
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").Select()
             screen_id = self.find_screen_id()
-            line = self.line_numb()
             try:
                 # button delete proposal
                 self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_PROPOSAL").press()
@@ -2120,7 +2884,6 @@ class SapProcess(SAP):
                 # button delete proposal
                 screen_id = self.find_screen_id()
                 self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_PROPOSAL").press()
-            line = self.line_numb()
             try:
                 self.gui_session.findById("wnd[1]/usr/btnBUTTON_1").press()
                 i = 0
@@ -2138,8 +2901,7 @@ class SapProcess(SAP):
                 self.gui_session.findById("wnd[1]").sendVKey(0)
             except:
                 pass
-            line = self.line_numb()
-            saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+            saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
             if self.convert_to_number(str(saldo).strip()) == 0.00: 
                 return True
             else:
@@ -2150,7 +2912,7 @@ class SapProcess(SAP):
                     return True
                 
         except Exception as e:
-            log(f"Error in function check_proposal. Doc number {doc_number}: {e} Line: {line}", lte.error)
+            log(f"Error in function check_proposal. Doc number {doc_number}: {e} Line: {self.error_line(e)}", lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
                 self.kill_sap()
             return str(f"Error in function check_proposal. Doc number {doc_number}: {e}")
@@ -2166,14 +2928,13 @@ class SapProcess(SAP):
         bool: True if the line was found, False otherwise.
         """
         try:
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2").Select()
             net = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-NET_AMOUNT").text
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").Select()
             i = 0
             while self.check_line_exists(i, screen_id) is True:
-                saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
                 line = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,{i}]").text
                 if self.convert_to_number(str(saldo).strip()) == 0.00: 
                     return True
@@ -2181,12 +2942,12 @@ class SapProcess(SAP):
                     if str(line).strip() == str(net).strip():
                         j = i + 1
                         if self.check_line_exists(j, screen_id) is True:
-                            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(j).Selected = True
+                            self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(j).Selected = True
                             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_DELETE").press()
                         else:
                             return False
                     else:
-                        self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(i).Selected = True
+                        self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(i).Selected = True
                         self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_DELETE").press()
         
         except Exception as e:
@@ -2208,8 +2969,7 @@ class SapProcess(SAP):
         Bool: True if the line exists, False otherwise.
         """
         try:
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             t = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,{i}]").text
             if t != '' and t != '________________':
                 return True
@@ -2226,7 +2986,7 @@ class SapProcess(SAP):
     def process_po_types(self, doc_number, company_code, process_data, entry_data):
         try:
             screen_id = self.find_screen_id()
-            saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+            saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
             if self.convert_to_number(str(saldo).strip()) != 0.00:
                 vendor = process_data['vendor']
                 po_number = process_data['po_number']
@@ -2255,7 +3015,7 @@ class SapProcess(SAP):
                     entry_data['saldo'] = self.convert_to_number(saldo)
                     entry_data['searched_amount'] = self.convert_to_number(process_data['netto'])
                     po_lines_result = self.check_po_lines(entry_data)[1]
-                    saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                    saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
 
                     if saldo != 0:
                         info = self.po_type_transport_process(doc_number, process_data, po_lines_result, po_number, saldo)
@@ -2265,7 +3025,7 @@ class SapProcess(SAP):
                 if po_type_check_result == POType.EPO:
                     entry_data['saldo'] = self.convert_to_number(saldo)
                     po_lines_result = self.check_po_lines(entry_data)[1]
-                    saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                    saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
                     
                     info = self.po_type_epo_process(doc_number, po_lines_result, po_number, saldo)
                     if info != True:
@@ -2273,7 +3033,7 @@ class SapProcess(SAP):
 
                 if po_type_check_result == POType.Standard:
                     type = 3
-                    saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+                    saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
                     process_data_po = self.process_standard_po(doc_number, type, po_number)
 
                     if 'ERROR' in str(process_data_po).upper() or 'CANNOT BE PROCESSED' in str(process_data_po).upper() or 'DOCUMENT CAN NOT BE OPENED' in str(process_data_po).upper():
@@ -2343,14 +3103,14 @@ class SapProcess(SAP):
             # Case 3: Find matching line out of available PO lines
             while True:
                 screen_id = self.find_screen_id()
-                saldo = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
+                saldo = self.convert_to_number(self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
 
                 if saldo < 0:
                     if abs(saldo) >= po_lines_result['value']:
                         self.remove_last_line(po_lines_result['how_many_lines'])
-                        saldo = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
+                        saldo = self.convert_to_number(self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
                         screen_id = self.find_screen_id()
-                        self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = 0
+                        self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = 0
                         
                         # Count PO lines again
                         po_lines_result['how_many_lines'] = 0
@@ -2389,7 +3149,7 @@ class SapProcess(SAP):
                 
             if po_lines_result['how_many_lines'] > 1 and saldo > 0:
                 screen_id = self.find_screen_id(type=8)
-                self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = 0
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = 0
                 item_amount = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text
                 value = round(self.convert_to_number(item_amount) + saldo, 2)
                 self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text = value
@@ -2410,7 +3170,7 @@ class SapProcess(SAP):
                         self.remove_last_line(po_lines_result['how_many_lines'], doc_number)
 
                         # Update saldo and check lines
-                        saldo = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
+                        saldo = self.convert_to_number(self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text)
                         self.gui_session.findById("wnd[0]").sendVKey(0)
                         
                         if not self.count_po_lines_fast(po_lines_result['how_many_lines'], po_lines_result['value'], doc_number):
@@ -2448,7 +3208,7 @@ class SapProcess(SAP):
             how_many_lines = how_many_lines - 1
             if (how_many_lines - 1) < 0:
                 return False
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = how_many_lines
+            self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").verticalScrollbar.position = how_many_lines
             value = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text)
             
             return True
@@ -2462,7 +3222,7 @@ class SapProcess(SAP):
     def change_last_amount(self, how_many_lines, doc_number):
         try:
             screen_id = self.find_screen_id(type=8)
-            saldo = abs(self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text))
+            saldo = abs(self.convert_to_number(self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text))
             line_amount = self.convert_to_number(self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET/txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT[4,0]").text)
             if line_amount < saldo:
                 return False
@@ -2481,7 +3241,7 @@ class SapProcess(SAP):
     def remove_last_line(self, how_many_lines, doc_number):
         try:
             screen_id = self.find_screen_id(type=8)
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(how_many_lines - 1).Selected = True
+            self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(how_many_lines - 1).Selected = True
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_DELETE").press()
 
             return True
@@ -2494,14 +3254,7 @@ class SapProcess(SAP):
 
     def check_transport_vendor(self, doc_number, company_code, vendor):
         try:
-            df_vendorsMatrix = pd.read_excel('vendor matrix for RPA.xlsx')
-            df = df_vendorsMatrix[(df_vendorsMatrix['Company code'] == company_code) & (df_vendorsMatrix['Type'] == 'transport')]
-            df_check = df.loc[df['Vendor Id'] == vendor]
-
-            if not df_check.empty:
-                return True
-            
-            return False
+            return self.excel.is_transport_vendor(vendor, company_code)
 
         except Exception as e:
             raise Exception(f"Error occured in function check_transport_vendor. Doc number {doc_number}")
@@ -2517,8 +3270,7 @@ class SapProcess(SAP):
         bool: True if the line was found, False otherwise.
         """
         try:
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2").Select()
             net = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/txt/COCKPIT/SHDR_DISP-NET_AMOUNT").text
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").Select()
@@ -2533,7 +3285,7 @@ class SapProcess(SAP):
                     i += 1
                     return True, multiple_matches
                 else:
-                    self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(i).Selected = True
+                    self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET").getAbsoluteRow(i).Selected = True
                     self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/btnG_TC_ITEM_DET_DELETE").press()
 
             if i > 1:
@@ -2548,9 +3300,9 @@ class SapProcess(SAP):
                 self.kill_sap()
             raise Exception(f"Error occured in function find_matching_line_po_standard. SAP info: {info}")
         
-    def check_vmd(self, doc_number):
+    def check_vmd(self, doc_number, company_code=None):
         try:
-            vendor_details = self.get_vendor_details(doc_number)
+            vendor_details = self.get_vendor_details(doc_number, company_code=company_code)
             if vendor_details == False:
                 return f"Document {doc_number} cannot be processed. Vendor details could not be downloaded (check vmd)"
             indexing_details = self.get_indexing_details(doc_number, vendor_details.get('interco_vendor'))
@@ -2590,7 +3342,7 @@ class SapProcess(SAP):
                 self.kill_sap()
             return str(f"Error in function check_vmd. Doc number {doc_number}: {e}")
 
-    def get_vendor_details(self, doc_number, special_run=False, new_session=None):
+    def get_vendor_details(self, doc_number, special_run=False, new_session=None, company_code=None):
         try:
             if new_session == None:
                 new_session = self.gui_session
@@ -2601,6 +3353,15 @@ class SapProcess(SAP):
 
             interco_vendor = False
             bank_ids = []
+            cache_key = None
+
+            if special_run == False and company_code is not None:
+                vendor = new_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-VENDOR_NO").text
+                if vendor != '':
+                    cache_key = self.vendor_key(vendor, company_code)
+                    vendor_data = self.vendor_cache.get(cache_key)
+                    if vendor_data is not None:
+                        return vendor_data
 
             if special_run == False:
                 new_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-VENDOR_NO").SetFocus()
@@ -2663,6 +3424,8 @@ class SapProcess(SAP):
             # Go back to the previous screen
             new_session.findById("wnd[0]").sendVKey(3)
 
+            if cache_key is not None:
+                self.vendor_cache.put(cache_key, result_dict)
             return result_dict
 
         except Exception as e:
@@ -2672,6 +3435,19 @@ class SapProcess(SAP):
                 self.kill_sap()
             raise Exception(f"Error occured in function get_vendor_details. Doc number {doc_number}. SAP info: {info}")
 
+    def vendor_key(self, vendor, company_code):
+        """
+        This function is used to build the vendor cache key.
+
+        Parameters:
+        vendor (str): The vendor number.
+        company_code (str): The company code.
+
+        Returns:
+        tuple: (vendor, company code)
+        """
+        return (str(vendor).strip().lstrip('0'), str(company_code).strip().upper())
+
     def download_vat_numbers(self, screen_id):
         try:
             vat_numbers = []
@@ -2817,51 +3593,60 @@ class SapProcess(SAP):
         try:
             # Select initial PO screen and set focus on PO number
             screen_id = self.find_screen_id(type=6, tab=1)            
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
-            self.gui_session.findById("wnd[0]").sendVKey(2)
+            po_number = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text
+            po_snapshot = self.get_po_snapshot(po_number)
+            if all(field in po_snapshot for field in ('comp_code_po', 'invoicing_party', 'po_currency')):
+                comp_code_po = po_snapshot['comp_code_po']
+                invoicing_party = po_snapshot['invoicing_party']
+                po_currency = po_snapshot['po_currency']
+            else:
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").SetFocus()
+                self.gui_session.findById("wnd[0]").sendVKey(2)
 
-            # Access PO details by sending keys and selecting specific tabs
-            self.gui_session.findById("wnd[0]").sendVKey(26)  # Simulates pressing key for transaction
+                # Access PO details by sending keys and selecting specific tabs
+                self.gui_session.findById("wnd[0]").sendVKey(26)  # Simulates pressing key for transaction
 
-            # Retrieve company code and invoicing party details
-            screen_id = self.find_screen_id(type=2, tab=8)
-            comp_code_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1221/ctxtMEPO1222-BUKRS").text
-            if comp_code_po == '':
-                info = f"Document {doc_number} cannot be processed. There is no 'company code' on tab 'Org. Data' in this PO."
-                return info
+                # Retrieve company code and invoicing party details
+                screen_id = self.find_screen_id(type=2, tab=8)
+                comp_code_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1221/ctxtMEPO1222-BUKRS").text
+                if comp_code_po == '':
+                    info = f"Document {doc_number} cannot be processed. There is no 'company code' on tab 'Org. Data' in this PO."
+                    return info
             
-            screen_id = self.find_screen_id(type=2, tab=6)
-            screen_id = self.find_screen_id(type=9)
-            invoicing_party = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/txtTPART-VTEXT[1,0]").text
-            if invoicing_party == '':
-                info = f"Document {doc_number} cannot be processed. There is no 'invoicing party' on tab 'Partners' in this PO."
-                return info
-
-            # Locate and set Invoicing Party if present in details
-            row_index = 0
-            while True:  
-                text = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/txtTPART-VTEXT[1,{row_index}]").text
-                if "Invoicing Party" in text:
-                    invoicing_party = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/ctxtWRF02K-GPARN[2,{row_index}]").text
-                    break
-                if "_______" in text:
+                screen_id = self.find_screen_id(type=2, tab=6)
+                screen_id = self.find_screen_id(type=9)
+                invoicing_party = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/txtTPART-VTEXT[1,0]").text
+                if invoicing_party == '':
                     info = f"Document {doc_number} cannot be processed. There is no 'invoicing party' on tab 'Partners' in this PO."
                     return info
-                row_index += 1
-
-            # Retrieve PO Currency
-            screen_id = self.find_screen_id(type=2, tab=1)
-            screen_id = self.find_screen_id(type=10)
-            po_currency = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT1/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1226/ctxtMEPO1226-WAERS").text
-            po_currency = str(po_currency).upper()
-            if po_currency == '':
-                info = f"Document {doc_number} cannot be processed. There is no 'po currency' on tab 'Delivery/Invoice' in this PO."
-                return info
-            self.gui_session.findById("wnd[0]").sendVKey(3)
+
+                # Locate and set Invoicing Party if present in details
+                row_index = 0
+                while True:  
+                    text = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/txtTPART-VTEXT[1,{row_index}]").text
+                    if "Invoicing Party" in text:
+                        invoicing_party = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT6/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1224/subPARTNERS:SAPLEKPA:0111/tblSAPLEKPATC_0111/ctxtWRF02K-GPARN[2,{row_index}]").text
+                        break
+                    if "_______" in text:
+                        info = f"Document {doc_number} cannot be processed. There is no 'invoicing party' on tab 'Partners' in this PO."
+                        return info
+                    row_index += 1
+
+                # Retrieve PO Currency
+                screen_id = self.find_screen_id(type=2, tab=1)
+                screen_id = self.find_screen_id(type=10)
+                po_currency = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT1/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1226/ctxtMEPO1226-WAERS").text
+                po_currency = str(po_currency).upper()
+                if po_currency == '':
+                    info = f"Document {doc_number} cannot be processed. There is no 'po currency' on tab 'Delivery/Invoice' in this PO."
+                    return info
+                self.gui_session.findById("wnd[0]").sendVKey(3)
+                self.update_po_snapshot(po_number, {'comp_code_po': comp_code_po, 'invoicing_party': invoicing_party, 'po_currency': po_currency})
 
             # Retrieve Vendor PO details (Assuming get_vendor_po_details is defined)
-            result = self.get_vendor_po_details(doc_number, invoicing_party, comp_code_po) # , vendor_vat_numbers, vendor_bank_ids, vendor_ile_bankow)
-            self.gui_session = self.gui_connection.children.ElementAt(0)
+            with self.helper_session_lock:
+                result = self.get_vendor_po_details(doc_number, invoicing_party, comp_code_po) # , vendor_vat_numbers, vendor_bank_ids, vendor_ile_bankow)
+            self.gui_session = self.get_session(0)
             if "cannot be processed" in result:
                 return result
             result_dict = {
@@ -2888,12 +3673,17 @@ class SapProcess(SAP):
         
     def get_vendor_po_details(self, doc_number, invoicing_party, comp_code_po):
         try:
+            cache_key = self.vendor_key(invoicing_party, comp_code_po)
+            vendor_data = self.vendor_cache.get(cache_key)
+            if vendor_data is not None:
+                return vendor_data
+
             new_gui_session = self.new_session()
-            time.sleep(1)
             if new_gui_session == False:
                 return f"Document {doc_number} cannot be processed. Vendor details could not be downloaded. New SAP session couldn't be started"
             new_gui_session.findById("wnd[0]/tbar[0]/okcd").text = "/nxk03"  # Example: Open the transaction SE38
             new_gui_session.findById("wnd[0]").sendVKey(0)
+            self.wait_for_element("wnd[0]/usr/ctxtRF02K-LIFNR", new_gui_session, timeout=10)
             new_gui_session.findById("wnd[0]/usr/ctxtRF02K-LIFNR").text = invoicing_party
             new_gui_session.findById("wnd[0]/usr/ctxtRF02K-BUKRS").text = comp_code_po
             new_gui_session.findById("wnd[0]").sendVKey(8)
@@ -2901,7 +3691,7 @@ class SapProcess(SAP):
             new_gui_session.findById("wnd[0]").sendVKey(0)
             
             if str(new_gui_session.findById("wnd[0]/sbar").messagetype) == "E":
-                sap_info = str(f"SAP info: {new_gui_session.findById("wnd[0]/sbar").text}")
+                sap_info = str(f"SAP info: {new_gui_session.findById('wnd[0]/sbar').text}")
                 info = self.close_additional_session(new_gui_session)
                 new_gui_session = None
                 return sap_info
@@ -2915,6 +3705,7 @@ class SapProcess(SAP):
             info = self.close_additional_session(new_gui_session)
             new_gui_session = None
 
+            self.vendor_cache.put(cache_key, vendor_data)
             return vendor_data
 
         except Exception as e:
@@ -2936,38 +3727,29 @@ class SapProcess(SAP):
         """
         try:
             screen_id = self.find_screen_id()
-            line = self.line_numb()
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB4").select()
-            line = self.line_numb()
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB4/ssubSUB:/COCKPIT/SAPLDISPLAY46:0404/subSUB_VEND:/COCKPIT/SAPLDISPLAY46:0435/btnMAST").press()
-            line = self.line_numb()
             # check if vendor is marked for deletion
             info = self.confirm_extra_window()
             if info != None and "is marked for deletion" in info:
                 return info
             try:
                 self.gui_session.findById("wnd[0]/usr/subSCREEN_3000_RESIZING_AREA:SAPLBUS_LOCATOR:2000/subSCREEN_1010_RIGHT_AREA:SAPLBUPA_DIALOG_JOEL:1000/ssubSCREEN_1000_WORKAREA_AREA:SAPLBUPA_DIALOG_JOEL:1100/ssubSCREEN_1100_MAIN_AREA:SAPLBUPA_DIALOG_JOEL:1101/tabsGS_SCREEN_1100_TABSTRIP/tabpSCREEN_1100_TAB_07").select()
-                line = self.line_numb()
                 self.gui_session.findById("wnd[0]/usr/subSCREEN_3000_RESIZING_AREA:SAPLBUS_LOCATOR:2000/subSCREEN_1010_RIGHT_AREA:SAPLBUPA_DIALOG_JOEL:1000/ssubSCREEN_1000_WORKAREA_AREA:SAPLBUPA_DIALOG_JOEL:1100/ssubSCREEN_1100_MAIN_AREA:SAPLBUPA_DIALOG_JOEL:1101/tabsGS_SCREEN_1100_TABSTRIP/tabpSCREEN_1100_TAB_07/ssubSCREEN_1100_TABSTRIP_AREA:SAPLBUSS:0028/ssubGENSUB:SAPLBUSS:7120/subA10P01:SAPLCVI_FS_UI_VENDOR_ENH:0045/btnPUSH_CVIV_PAYEE").press()
             except:
-                line = self.line_numb()
                 self.gui_session.findById("wnd[0]/usr/subSCREEN_3000_RESIZING_AREA:SAPLBUS_LOCATOR:2000/subSCREEN_1010_RIGHT_AREA:SAPLBUPA_DIALOG_JOEL:1000/ssubSCREEN_1000_WORKAREA_AREA:SAPLBUPA_DIALOG_JOEL:1100/ssubSCREEN_1100_MAIN_AREA:SAPLBUPA_DIALOG_JOEL:1101/tabsGS_SCREEN_1100_TABSTRIP/tabpSCREEN_1100_TAB_08").select()
-                line = self.line_numb()
                 self.gui_session.findById("wnd[0]/usr/subSCREEN_3000_RESIZING_AREA:SAPLBUS_LOCATOR:2000/subSCREEN_1010_RIGHT_AREA:SAPLBUPA_DIALOG_JOEL:1000/ssubSCREEN_1000_WORKAREA_AREA:SAPLBUPA_DIALOG_JOEL:1100/ssubSCREEN_1100_MAIN_AREA:SAPLBUPA_DIALOG_JOEL:1101/tabsGS_SCREEN_1100_TABSTRIP/tabpSCREEN_1100_TAB_08/ssubSCREEN_1100_TABSTRIP_AREA:SAPLBUSS:0028/ssubGENSUB:SAPLBUSS:7120/subA10P01:SAPLCVI_FS_UI_VENDOR_ENH:0045/btnPUSH_CVIV_PAYEE").press()
             try:
-                line = self.line_numb()
                 self.gui_session.findById("wnd[1]/tbar[0]/btn[12]").press()
-                line = self.line_numb()
                 self.gui_session.findById("wnd[0]/tbar[0]/btn[3]").press()
                 # permitted payee
                 return True
             except:
-                line = self.line_numb()
                 self.gui_session.findById("wnd[0]/tbar[0]/btn[3]").press()
                 # not permitted payee
                 return False
         except Exception as e:
-            log(f"Error in function check_permitted_payee.Doc number: {doc_number} line: {line}. {e}", lte.error)
+            log(f"Error in function check_permitted_payee.Doc number: {doc_number} line: {self.error_line(e)}. {e}", lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
                 self.kill_sap()
             return str(f"Error in function check_permitted_payee. {e}")
@@ -2983,14 +3765,10 @@ class SapProcess(SAP):
         valid (bool): True if all fields are valid, list otherwise.
         """
         try:
-            line = self.line_numb()
-            self.gui_session = self.gui_connection.children.ElementAt(0)
-            self.gui_session.findById("wnd[0]").maximize()
+            self.gui_session = self.get_session(0)
             fields = []
-            line = self.line_numb()
             screen_id = self.find_screen_id()
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2").Select()
-            line = self.line_numb()
             
             # Define a list of fields with their corresponding paths and names
             field_checks = [
@@ -3025,7 +3803,7 @@ class SapProcess(SAP):
             return True
         
         except Exception as e:
-            log(f"Error in function check_fields. Doc number {doc_number}: {e} Line: {line}", lte.error)
+            log(f"Error in function check_fields. Doc number {doc_number}: {e} Line: {self.error_line(e)}", lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
                 self.kill_sap()
             return str(f"Error in function check_fields. Doc number {doc_number}: {e}")
@@ -3048,42 +3826,54 @@ class SapProcess(SAP):
             vendor_inv = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-VENDOR_NO").text
             company_code_inv = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB2/ssubSUB:/COCKPIT/SAPLDISPLAY46:0402/ctxt/COCKPIT/SHDR_DISP-COMP_CODE").text
             self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1").select()
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").setFocus()
-            self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").caretPosition = 4
-            self.gui_session.findById("wnd[0]").sendVKey(2)
-            # expand header
-            self.gui_session.findById("wnd[0]").sendVKey(26)
-            # select PO tab
-            type = 1
-            self.select_po_tab(type)
-            # check vendor number
-            screen_id = self.find_screen_id_po(type)
-            vendor_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB0:SAPLMEGUI:0030/subSUB1:SAPLMEGUI:1105/ctxtMEPO_TOPLINE-SUPERFIELD").text
-            p = str(vendor_po).find(" ")
-            vendor_po = vendor_po[:p]
+            po_number = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").text
+            po_snapshot = self.get_po_snapshot(po_number)
+            if all(field in po_snapshot for field in ('vendor_po', 'currency_po', 'company_code_po', 'has_invoicing_party')):
+                vendor_po = po_snapshot['vendor_po']
+                currency_po = po_snapshot['currency_po']
+                company_code_po = po_snapshot['company_code_po']
+                has_invoicing_party = po_snapshot['has_invoicing_party']
+            else:
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").setFocus()
+                self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER").caretPosition = 4
+                self.gui_session.findById("wnd[0]").sendVKey(2)
+                # expand header
+                self.gui_session.findById("wnd[0]").sendVKey(26)
+                # select PO tab
+                type = 1
+                self.select_po_tab(type)
+                # vendor number
+                screen_id = self.find_screen_id_po(type)
+                vendor_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB0:SAPLMEGUI:0030/subSUB1:SAPLMEGUI:1105/ctxtMEPO_TOPLINE-SUPERFIELD").text
+                p = str(vendor_po).find(" ")
+                vendor_po = vendor_po[:p]
+                # currency
+                type = 2
+                screen_id = self.find_screen_id_po(type)
+                currency_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT1/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1226/ctxtMEPO1226-WAERS").text
+                # company code
+                type = 3
+                screen_id = self.find_screen_id_po(type)
+                self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8").select()
+                company_code_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1221/ctxtMEPO1222-BUKRS").text
+                # invoice party
+                b = 0
+                for b in range(31):
+                    if self.switch_po_tab6(b):
+                        break
+                has_invoicing_party = self.get_invoicing_party_from_po(doc_number)
+                self.gui_session.findById("wnd[0]").sendVKey(3)
+                if isinstance(has_invoicing_party, bool):
+                    self.update_po_snapshot(po_number, {'vendor_po': vendor_po, 'currency_po': currency_po, 'company_code_po': company_code_po, 'has_invoicing_party': has_invoicing_party})
+
             if vendor_inv != vendor_po:
                 info_list.append("vendor number")
-            # check currency
-            type = 2
-            screen_id = self.find_screen_id_po(type)
-            currency_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT1/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1226/ctxtMEPO1226-WAERS").text
             if currency_inv != currency_po:
                 info_list.append("currency")
-            # check company code
-            type = 3
-            screen_id = self.find_screen_id_po(type)
-            self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8").select()
-            company_code_po = self.gui_session.findById(f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{screen_id}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT8/ssubTABSTRIPCONTROL2SUB:SAPLMEGUI:1221/ctxtMEPO1222-BUKRS").text
             if company_code_inv != company_code_po:
                 info_list.append("company code")
-            # get invoice party
-            b = 0
-            for b in range(31):
-                if self.switch_po_tab6(b):
-                    break
-            if not self.get_invoicing_party_from_po(doc_number):
+            if not has_invoicing_party:
                 info_list.append("There is no invoicing party on tab 'Partners' in this PO.")
-            self.gui_session.findById("wnd[0]").sendVKey(3)
 
             return info_list
         
@@ -3399,26 +4189,11 @@ class SapProcess(SAP):
         Returns:
         posting_date (str): The posting date otherwise None.
         """
-        from datetime import datetime 
-        try:
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            dfs = self.excel.get_calendar()
-            df_3B5 = dfs[0]
-            df_V436 = dfs[1]
-            if company_code == '3B5':
-                if not df_3B5[df_3B5['Date']==current_date]['Date to be taken for posting'].empty:
-                    row_3B5 = df_3B5[df_3B5['Date']==current_date]['Date to be taken for posting'].index[0]
-                    value_3B5 = df_3B5.at[row_3B5, 'Date to be taken for posting']
-                    return value_3B5
-                else:
-                    return None
-            elif company_code == 'V436':
-                if not df_V436[df_V436['Date']==current_date]['Date to be taken for posting'].empty:
-                    row_V436 = df_V436[df_V436['Date']==current_date]['Date to be taken for posting'].index[0]
-                    value_V436 = df_V436.at[row_V436, 'Date to be taken for posting']
-                    return value_V436
-                else:
-                    return None
+        try:
+            if company_code not in ('3B5', 'V436'):
+                return None
+            # 'Calendar.xlsx' is read once per run, see ExcelProcess.load_calendar
+            return self.excel.get_posting_date(company_code)
         except Exception as e:
             log(f"Error in function get_date. {e}", lte.error)
             if 'The object invoked has disconnected from its clients.' in str(e):
@@ -3461,7 +4236,7 @@ class SapProcess(SAP):
     def check_saldo(self, doc_number):
         try:
             screen_id = self.find_screen_id()
-            saldo = self.gui_session.findById(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
+            saldo = self.find_element(f"wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0{screen_id}/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO").text
             if saldo == "":
                 return False
 
@@ -3663,7 +4438,11 @@ class SapProcess(SAP):
 
     def get_posting_number(self, doc_number):
         try:
-            posting_number = self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").getCellValue(0, "SAP_DOC_NO")
+            row = self.current_row
+            if self.use_document_index and self.current_document is not None:
+                # the list is refreshed after posting, look the row up again
+                row = self.locate_document(*self.current_document)
+            posting_number = self.gui_session.findById("wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell").getCellValue(row, "SAP_DOC_NO")
 
             return posting_number
         
@@ -3685,17 +4464,42 @@ class SapProcess(SAP):
         screen_id (str): The ID of the current screen and tab selected if given.
         """
         try:
+            # try the screen number that matched last time for this key first
+            key = (type, tab, session_nr, middle_path_id)
+            cached = self.screen_id_cache.get(key)
+            if cached is not None and self.is_screen(cached, type=type, tab=tab, session_nr=session_nr, middle_path_id=middle_path_id) is True:
+                self.screen_id_hits += 1
+                return self.format_screen_id(cached)
+            self.screen_id_misses += 1
+
             if type in [1, 2, 3, 4, 5, 7, 9, 10, 11, 12, 13]:
                 start, end = 0, 50
             else:
                 start, end = 370, 399
 
+            probed = {cached}
+            if self.screen_discovery:
+                candidates = self.discover_screen_ids(session_nr)
+                if candidates is not None:
+                    family = 'cockpit' if type in [None, 6, 8] else 'bp' if type == 11 else 'megui'
+                    for i in candidates.get(family, []):
+                        if start <= i < end and i not in probed:
+                            probed.add(i)
+                            if self.is_screen(i, type=type, tab=tab, session_nr=session_nr, middle_path_id=middle_path_id) is True:
+                                self.screen_id_discovered += 1
+                                self.screen_id_cache[key] = i
+                                return self.format_screen_id(i)
+                    # the element can sit in a container the discovery does not know, the other numbers are probed
+                    self.screen_id_discovery_misses += 1
+
             for i in range(start, end):
+                if i in probed:
+                    continue
                 if self.is_screen(i, type=type, tab=tab, session_nr=session_nr, middle_path_id=middle_path_id) is True:
-                    screen_id = i
-                    if screen_id < 10:
-                        screen_id = f"0{screen_id}"
-                    return screen_id
+                    self.screen_id_cache[key] = i
+                    return self.format_screen_id(i)
+
+            self.screen_id_cache.pop(key, None)
                 
         except Exception as e:
             info = self.gui_session.findById("wnd[0]/sbar").Text
@@ -3704,6 +4508,176 @@ class SapProcess(SAP):
                 self.kill_sap()
             raise Exception(f"Error occured in function find_screen_id. SAP info: {info}")
     
+    def format_screen_id(self, screen_id):
+        """
+        This function is used to format a screen number the way it is used in element IDs.
+
+        Parameters:
+        screen_id (int): The screen number.
+
+        Returns:
+        screen_id (str or int): The screen number with leading zero if lower than 10.
+        """
+        if screen_id < 10:
+            screen_id = f"0{screen_id}"
+        return screen_id
+
+    def discover_screen_ids(self, session_nr=0):
+        """
+        This function is used to read the screen numbers of the main containers in one pass over wnd[0]/usr children.
+
+        Parameters:
+        optional: session_nr (int): The session number.
+
+        Returns:
+        dict: screen numbers found per container family ('megui', 'cockpit', 'bp'), None if the tree could not be read.
+        """
+        try:
+            session = self.get_session(session_nr)
+            children = session.findById("wnd[0]/usr").Children
+            screen_ids = {}
+            for n in range(children.Count):
+                name = str(children.ElementAt(n).Id).split("/usr/", 1)[-1]
+                for family in ('megui', 'cockpit', 'bp'):
+                    prefix, offset = getattr(ScreenContainer, family)
+                    if name.startswith(prefix) and name[len(prefix):].isdigit():
+                        screen_ids.setdefault(family, []).append(int(name[len(prefix):]) - offset)
+            return screen_ids
+
+        except Exception as e:
+            log(f"Error in function discover_screen_ids: {e}", lte.error)
+            return None
+
+    def screen_id_stats(self):
+        """
+        This function is used to get hit/miss counters of the screen ID resolver.
+
+        Returns:
+        dict: cache hits, misses, discovered screen IDs, discovery misses and hit rate of find_screen_id.
+        """
+        lookups = self.screen_id_hits + self.screen_id_misses
+        hit_rate = round(self.screen_id_hits / lookups, 3) if lookups else 0.0
+        return {'hits': self.screen_id_hits, 'misses': self.screen_id_misses, 'discovered': self.screen_id_discovered,
+                'discovery_misses': self.screen_id_discovery_misses, 'hit_rate': hit_rate}
+
+    def wait_until(self, condition, timeout=30, name=None, max_interval=1.0):
+        """
+        This function is used to wait for a condition instead of sleeping for a fixed time.
+        The condition is polled with an interval growing from 50 ms to max_interval, the time spent is recorded under the wait name.
+
+        Parameters:
+        condition (callable): Returns True once the wait is over, exceptions count as False.
+        timeout (float): Maximum number of seconds to wait.
+        name (str): Name of the wait in wait_stats.
+        optional: max_interval (float): Longest interval between two polls in seconds.
+
+        Returns:
+        Bool: True if the condition was met, False if the timeout passed.
+        """
+        name = name or getattr(condition, '__name__', 'condition')
+        start = time.perf_counter()
+        interval = 0.05
+        while True:
+            try:
+                met = bool(condition())
+            except Exception:
+                met = False
+            elapsed = time.perf_counter() - start
+            if met or elapsed >= timeout:
+                break
+            time.sleep(min(interval, timeout - elapsed))
+            interval = min(interval * 2, max_interval)
+
+        stats = self.wait_stats_by_name.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        if not met:
+            stats['timeouts'] += 1
+            log(f"Waiting for {name} timed out after {round(elapsed, 2)} s")
+        return met
+
+    def wait_for_file(self, path, timeout=30, settle=0.2, name=None):
+        """
+        This function is used to wait until a file written by another process is complete.
+        The file is ready when it is not empty and its size and modification time did not change for settle seconds,
+        it is checked every 50 ms.
+
+        Parameters:
+        path (str): The file.
+        optional: timeout (float): Maximum number of seconds to wait.
+        optional: settle (float): Seconds without a change of the file.
+        optional: name (str): Name of the wait in wait_stats.
+
+        Returns:
+        Bool: True if the file is ready, False if the timeout passed.
+        """
+        last = {'stat': None, 'since': None}
+
+        def file_ready():
+            stat = os.stat(path)
+            now = time.perf_counter()
+            if stat.st_size == 0 or (stat.st_size, stat.st_mtime_ns) != last['stat']:
+                last['stat'], last['since'] = (stat.st_size, stat.st_mtime_ns), now
+                return False
+            return now - last['since'] >= settle
+
+        return self.wait_until(file_ready, timeout=timeout, name=name or f"file {os.path.basename(path)}", max_interval=0.05)
+
+    def wait_while_busy(self, session=None, timeout=30):
+        """
+        This function is used to wait until a GUI session has finished processing a request.
+
+        Parameters:
+        session (object): The GUI session, the current one if not given.
+        timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+        Bool: True if the session is idle, False if the timeout passed.
+        """
+        session = session or self.gui_session
+        return self.wait_until(lambda: not session.Busy, timeout=timeout, name="session busy")
+
+    def wait_for_element(self, element_id, session=None, timeout=30):
+        """
+        This function is used to wait until a GUI element exists.
+
+        Parameters:
+        element_id (str): The ID of the element.
+        session (object): The GUI session, the current one if not given.
+        timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+        Bool: True if the element exists, False if the timeout passed.
+        """
+        session = session or self.gui_session
+        return self.wait_until(lambda: session.findById(element_id, False) is not None, timeout=timeout, name=f"element {element_id}")
+
+    def wait_for_status_change(self, previous_text, session=None, timeout=30):
+        """
+        This function is used to wait until the status bar shows a message other than the given one.
+
+        Parameters:
+        previous_text (str): The status bar text before the action.
+        session (object): The GUI session, the current one if not given.
+        timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+        Bool: True if the status bar changed, False if the timeout passed.
+        """
+        session = session or self.gui_session
+        return self.wait_until(lambda: session.findById("wnd[0]/sbar").Text != previous_text, timeout=timeout, name="status bar")
+
+    def wait_stats(self):
+        """
+        This function is used to get the time spent in wait_until per wait name.
+
+        Returns:
+        dict: count, total and longest seconds and number of timeouts per wait name.
+        """
+        return {name: {'count': stats['count'], 'total': round(stats['total'], 2), 'max': round(stats['max'], 2), 'timeouts': stats['timeouts']}
+                for name, stats in self.wait_stats_by_name.items()}
+
     def is_screen(self, i, type=None, tab=None, session_nr=0, middle_path_id=None):
         """
         This function is used to check if the current view is a screen in the system.
@@ -3717,7 +4691,7 @@ class SapProcess(SAP):
         try:
             if i < 10 and type == 11:
                 i = f"0{i}"
-            self.gui_session = self.gui_connection.children.ElementAt(session_nr)
+            self.gui_session = self.get_session(session_nr)
             paths = {
                 1: f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{i}/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211/txtMEPO1211-EBELP[1,0]",
                 2: f"wnd[0]/usr/subSUB0:SAPLMEGUI:00{i}/subSUB1:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1102/tabsHEADER_DETAIL/tabpTABHDT{tab}",
@@ -3757,8 +4731,7 @@ class SapProcess(SAP):
                 self.kill_sap()
             raise Exception(f"Error occured in function is_screen. SAP info: {info}")
 
-    def line_numb(self):
-        import inspect
-        '''Returns the current line number in our program'''
-        return inspect.currentframe().f_back.f_lineno
+    def error_line(self, e):
+        '''Returns the line of the function catching the exception which raised it, read only when there is an error'''
+        return e.__traceback__.tb_lineno if e.__traceback__ is not None else None
     
\ No newline at end of file
@@ -0,0 +1,555 @@
+import json
+import os
+import re
+import time
+import collections
+
+
+class SimulatorError(Exception):
+    """Raised where SAP GUI scripting raises a COM error, with the same message."""
+
+
+class GuiCollection:
+    """Collection of GUI objects, e.g. the children of a container or the sessions of a connection."""
+    def __init__(self, session, items):
+        self._session = session
+        self._items = list(items)
+
+    def __getattr__(self, name):
+        if name.lower() == 'count':
+            self._session.count_call('Count')
+            return len(self._items)
+        if name.lower() == 'length':
+            return len(self._items)
+        if name.lower() == 'elementat':
+            return self.__call__
+        raise AttributeError(name)
+
+    def __call__(self, index):
+        self._session.count_call('ElementAt')
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class GuiObject:
+    """
+    The GuiObject class is the base of the simulated GUI scripting objects.
+    As with COM, names of properties and methods are case insensitive, e.g. text and Text or Select and select.
+
+    Attributes:
+    -----------
+    Id : str
+        The ID of the object, e.g. /app/con[0]/ses[0]/wnd[0]/sbar.
+    Name : str
+        The last part of the ID, e.g. sbar, unless the fixture gives one.
+    properties : dict
+        Property values keyed by lower case name.
+    """
+    def __init__(self, session, element_id, **properties):
+        object.__setattr__(self, '_session', session)
+        object.__setattr__(self, '_id', element_id)
+        object.__setattr__(self, '_properties', {name.lower(): value for name, value in properties.items()})
+
+    def __getattr__(self, name):
+        lower = name.lower()
+        if lower.startswith('_'):
+            raise AttributeError(name)
+        if lower == 'id':
+            self._session.count_call('Id')
+            return self._session.full_id(self._id)
+        if lower == 'name' and 'name' not in self._properties:
+            # e.g. wnd[1] for the ActiveWindow checks, good enough for the IDs of the fixtures
+            self._session.count_call(name)
+            return self._id.rsplit('/', 1)[-1]
+        attribute = getattr(type(self), lower, None)
+        if callable(attribute):
+            return getattr(self, lower)
+        if isinstance(attribute, property):
+            self._session.count_call(name)
+            return attribute.fget(self)
+        if lower in self._properties:
+            self._session.count_call(name)
+            return self._properties[lower]
+        raise AttributeError(f"{type(self).__name__} {self._id} has no property {name}")
+
+    def __setattr__(self, name, value):
+        lower = name.lower()
+        attribute = getattr(type(self), lower, None)
+        self._session.count_call(f"{name}=")
+        if isinstance(attribute, property):
+            attribute.fset(self, value)
+        else:
+            self._properties[lower] = value
+
+    def call(self, method, *args):
+        self._session.count_call(method)
+        self._session.trigger(self._id, method.lower(), *args)
+
+    # actions of buttons, tabs and fields, a transition of the screen may be bound to them
+    def press(self):
+        self.call('press')
+
+    def select(self):
+        self.call('select')
+
+    def setfocus(self):
+        # F2 and Enter on the window act on the focused field, see SimulatedSession.trigger
+        object.__setattr__(self._session, 'focus', self._id)
+        self.call('setFocus')
+
+    def maximize(self):
+        self.call('maximize')
+
+    def sendvkey(self, key):
+        self.call('sendVKey', key)
+
+    def close(self):
+        self.call('close')
+
+    def createsession(self):
+        self._session.count_call('createSession')
+        self._session.connection.create_session(self._session)
+
+
+class GuiUserArea(GuiObject):
+    """The wnd[0]/usr container, its children are the subscreen containers of the current screen."""
+    @property
+    def children(self):
+        return GuiCollection(self._session, self._session.children_of_usr())
+
+
+class GuiTableControl(GuiObject):
+    """
+    Table control with a vertical scrollbar, only VisibleRowCount rows from the scroll position are addressable.
+    Cells are reached with GetCell(row, column) or findById(f"{table_id}/{column_name}[column,row]").
+    """
+    def __init__(self, session, element_id, columns, rows, visible_rows=10):
+        super().__init__(session, element_id)
+        object.__setattr__(self, '_columns', columns)
+        object.__setattr__(self, '_rows', rows)
+        object.__setattr__(self, '_visible_rows', visible_rows)
+        object.__setattr__(self, '_scrollbar', GuiScrollbar(session, f"{element_id}/vsb", self))
+
+    @property
+    def rowcount(self):
+        return len(self._rows)
+
+    @property
+    def visiblerowcount(self):
+        return self._visible_rows
+
+    @property
+    def verticalscrollbar(self):
+        return self._scrollbar
+
+    def getcell(self, row, column):
+        self._session.count_call('GetCell')
+        return self.cell(row, column)
+
+    def cell(self, row, column):
+        absolute_row = self._scrollbar.position_value + row
+        if row >= self._visible_rows or column >= len(self._columns):
+            raise SimulatorError("The control could not be found by id.")
+        values = self._rows[absolute_row] if absolute_row < len(self._rows) else []
+        # rows below the last filled one are shown as empty input fields
+        text = values[column] if column < len(values) else ''
+        return GuiObject(self._session, f"{self._id}/{self._columns[column]}[{column},{row}]", text=text)
+
+    def getabsoluterow(self, row):
+        self._session.count_call('getAbsoluteRow')
+        return GuiObject(self._session, f"{self._id}/row[{row}]", selected=False)
+
+
+class GuiScrollbar(GuiObject):
+    """Vertical scrollbar of a table control."""
+    def __init__(self, session, element_id, table):
+        super().__init__(session, element_id)
+        object.__setattr__(self, '_table', table)
+        object.__setattr__(self, 'position_value', 0)
+
+    @property
+    def position(self):
+        return self.position_value
+
+    @position.setter
+    def position(self, value):
+        object.__setattr__(self, 'position_value', max(0, min(int(value), self.maximum)))
+
+    @property
+    def maximum(self):
+        return max(len(self._table._rows) - self._table._visible_rows, 0)
+
+    @property
+    def minimum(self):
+        return 0
+
+    @property
+    def pagesize(self):
+        return self._table._visible_rows
+
+
+class GuiGridView(GuiObject):
+    """ALV grid, cells are read with getCellValue(row, column) where column is the technical column name."""
+    def __init__(self, session, element_id, rows, visible_rows=20):
+        super().__init__(session, element_id, firstvisiblerow=0, currentcellrow=-1, currentcellcolumn='', selectedrows='')
+        object.__setattr__(self, '_rows', rows)
+        object.__setattr__(self, '_visible_rows', visible_rows)
+
+    @property
+    def rowcount(self):
+        return len(self._rows)
+
+    @property
+    def visiblerowcount(self):
+        return self._visible_rows
+
+    def getcellvalue(self, row, column):
+        self._session.count_call('getCellValue')
+        if row < 0 or row >= len(self._rows):
+            raise SimulatorError(f"Row {row} of {self._id} does not exist.")
+        return str(self._rows[row].get(column, ''))
+
+    def setcurrentcell(self, row, column):
+        self._session.count_call('setCurrentCell')
+        self._properties['currentcellrow'] = row
+        self._properties['currentcellcolumn'] = column
+
+    def doubleclickcurrentcell(self):
+        self.call('doubleClickCurrentCell')
+
+    def presstoolbarbutton(self, button):
+        self.call('pressToolbarButton', button)
+
+    def presstoolbarcontextbutton(self, button):
+        self.call('pressToolbarContextButton', button)
+
+    def selectcontextmenuitem(self, item):
+        self.call('selectContextMenuItem', item)
+
+
+class SimulatedSession(GuiObject):
+    """
+    The SimulatedSession class replaces a SAP GUI session, the screens come from fixture files, see load_screens.
+
+    Attributes:
+    -----------
+    screens : dict
+        Screen definitions by name.
+    screen : str
+        The name of the current screen.
+    calls : collections.Counter
+        Number of GUI calls per method or property.
+    latency : float
+        Seconds every call takes, to mimic the roundtrip of a real session.
+
+    Methods:
+    --------
+    findById(self, element_id, raise_error=True) -> GuiObject:
+        Returns the component of the current screen, None or a SimulatorError if it does not exist.
+
+    show(self, screen):
+        Makes the screen the current one.
+    """
+    def __init__(self, connection, number, screens, start_screen, latency=0.0):
+        object.__setattr__(self, 'calls', collections.Counter())
+        object.__setattr__(self, 'latency', latency)
+        object.__setattr__(self, 'connection', connection)
+        object.__setattr__(self, 'number', number)
+        object.__setattr__(self, 'screens', screens)
+        object.__setattr__(self, 'history', [])
+        object.__setattr__(self, 'screen', None)
+        object.__setattr__(self, 'components', {})
+        object.__setattr__(self, 'focus', None)
+        super().__init__(self, f"ses[{number}]", busy=False)
+        self.show(start_screen)
+
+    def count_call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def full_id(self, element_id):
+        if element_id.startswith('/app/'):
+            return element_id
+        if element_id.startswith('ses['):
+            return f"{self.connection.full_id()}/{element_id}"
+        return f"{self.connection.full_id()}/ses[{self.number}]/{element_id}"
+
+    def relative_id(self, element_id):
+        element_id = str(element_id)
+        prefix = f"{self.connection.full_id()}/ses[{self.number}]/"
+        if element_id.startswith(prefix):
+            return element_id[len(prefix):]
+        return element_id.lstrip('/')
+
+    def show(self, screen):
+        if screen not in self.screens:
+            raise SimulatorError(f"Screen {screen} is not in the fixtures.")
+        if self.screen is not None:
+            self.history.append(self.screen)
+        object.__setattr__(self, 'screen', screen)
+        object.__setattr__(self, 'focus', None)
+        object.__setattr__(self, 'components', self.build_components(self.screens[screen]))
+
+    def back(self):
+        previous = self.history.pop() if self.history else self.screen
+        object.__setattr__(self, 'screen', previous)
+        object.__setattr__(self, 'focus', None)
+        object.__setattr__(self, 'components', self.build_components(self.screens[previous]))
+
+    def build_components(self, screen):
+        components = {
+            'wnd[0]': GuiObject(self, 'wnd[0]', text=screen.get('title', '')),
+            'wnd[0]/usr': GuiUserArea(self, 'wnd[0]/usr'),
+            'wnd[0]/tbar[0]/okcd': GuiObject(self, 'wnd[0]/tbar[0]/okcd', text=''),
+            'wnd[0]/sbar': GuiObject(self, 'wnd[0]/sbar', **{'text': '', 'messagetype': '', **screen.get('status_bar', {})})
+        }
+        for element_id, spec in screen.get('elements', {}).items():
+            spec = dict(spec)
+            kind = spec.pop('type', 'field')
+            if kind == 'table':
+                components[element_id] = GuiTableControl(self, element_id, spec['columns'], spec.get('rows', []), spec.get('visible_rows', 10))
+            elif kind == 'grid':
+                components[element_id] = GuiGridView(self, element_id, spec.get('rows', []), spec.get('visible_rows', 20))
+            else:
+                components[element_id] = GuiObject(self, element_id, **spec)
+        return components
+
+    def component(self, element_id):
+        element_id = self.relative_id(element_id)
+        component = self.components.get(element_id)
+        if component is not None:
+            return component
+        # cell of a table control, e.g. .../tblSAPLMEGUITC_1211/txtMEPO1211-EBELP[1,0]
+        match = re.match(r'^(.*)/([^/]+)\[(\d+),(\d+)\]$', element_id)
+        if match is not None:
+            table = self.components.get(match.group(1))
+            if isinstance(table, GuiTableControl) and match.group(2) in table._columns:
+                try:
+                    return table.cell(int(match.group(4)), int(match.group(3)))
+                except SimulatorError:
+                    return None
+        return None
+
+    def findbyid(self, element_id, raise_error=True):
+        self.count_call('findById')
+        component = self.component(element_id)
+        if component is None and raise_error:
+            raise SimulatorError("The control could not be found by id.")
+        return component
+
+    @property
+    def info(self):
+        screen = self.screens[self.screen]
+        return GuiObject(self, 'info', transaction=screen.get('transaction', ''), screennumber=screen.get('screen_number', 0),
+                         program=screen.get('program', ''), systemname=self.connection.system_name, sessionnumber=self.number + 1, user='RPA')
+
+    @property
+    def activewindow(self):
+        windows = sorted((element_id for element_id in self.components if re.match(r'^wnd\[\d+\]$', element_id)), reverse=True)
+        return self.components[windows[0]]
+
+    @property
+    def parent(self):
+        return self.connection
+
+    @property
+    def children(self):
+        return GuiCollection(self, [component for element_id, component in self.components.items() if re.match(r'^wnd\[\d+\]$', element_id)])
+
+    def trigger(self, element_id, action, *args):
+        # Enter with a transaction code in the command field starts that transaction
+        if element_id == 'wnd[0]' and action == 'sendvkey' and args and args[0] == 0:
+            code = str(self.components['wnd[0]/tbar[0]/okcd']._properties.get('text', '')).strip()
+            if code:
+                self.start_transaction(code)
+                return
+        transitions = self.screens[self.screen].get('transitions', {})
+        argument = f":{args[0]}" if args else ''
+        target = None
+        if element_id == 'wnd[0]' and action == 'sendvkey' and self.focus is not None:
+            target = transitions.get(f"{self.focus}|{action}{argument}")
+        if target is None:
+            target = transitions.get(f"{element_id}|{action}{argument}")
+        if target is None:
+            return
+        if '{' in target:
+            # e.g. document_{row} for the selected cockpit row or po_{text} for the PO number in the focused field
+            target = target.format(row=self.selected_row(), text=self.focused_text())
+        if target == 'back':
+            self.back()
+        else:
+            self.show(target)
+
+    def selected_row(self):
+        for component in self.components.values():
+            if isinstance(component, GuiGridView):
+                selected = str(component._properties.get('selectedrows', '')).split(',')[0].split('-')[0]
+                return int(selected) if selected.strip() != '' else component._properties.get('currentcellrow', -1)
+        return -1
+
+    def focused_text(self):
+        component = self.components.get(self.focus) if self.focus is not None else None
+        return str(component._properties.get('text', '')).strip() if component is not None else ''
+
+    def start_transaction(self, code):
+        transaction = code.lower().replace('/n', '', 1) if code.lower().startswith('/n') else code.lower()
+        for name, screen in self.screens.items():
+            if str(screen.get('transaction', '')).lower() == transaction and screen.get('initial', True):
+                self.history.clear()
+                object.__setattr__(self, 'screen', None)
+                self.show(name)
+                return
+        self.components['wnd[0]/sbar']._properties.update({'text': f"Transaction {code} does not exist", 'messagetype': 'E'})
+
+    def starttransaction(self, code):
+        self.count_call('StartTransaction')
+        self.start_transaction(code)
+
+    def children_of_usr(self):
+        names = []
+        for element_id in self.components:
+            if element_id.startswith('wnd[0]/usr/'):
+                # names of components start lower case, namespaces like /COCKPIT/ upper case
+                name = re.split(r'/(?=[a-z])', element_id[len('wnd[0]/usr/'):], maxsplit=1)[0]
+                if name not in names:
+                    names.append(name)
+        return [GuiObject(self, f"wnd[0]/usr/{name}") for name in names]
+
+
+class SimulatedConnection(GuiObject):
+    """Connection holding the simulated sessions, new sessions start on the screen of the session which created them."""
+    def __init__(self, application, number, screens, start_screen, latency=0.0, system_name='ACE'):
+        object.__setattr__(self, 'application', application)
+        object.__setattr__(self, 'number', number)
+        object.__setattr__(self, 'system_name', system_name)
+        object.__setattr__(self, 'sessions', [])
+        object.__setattr__(self, 'screens', screens)
+        object.__setattr__(self, 'latency', latency)
+        session = SimulatedSession(self, 0, screens, start_screen, latency)
+        self.sessions.append(session)
+        super().__init__(session, f"/app/con[{number}]")
+
+    def full_id(self, element_id=None):
+        return f"/app/con[{self.number}]"
+
+    @property
+    def children(self):
+        return GuiCollection(self._session, [session for session in self.sessions if session is not None])
+
+    def create_session(self, session):
+        # as in SAP GUI, the number of a closed session is used again
+        number = self.sessions.index(None) if None in self.sessions else len(self.sessions)
+        new_session = SimulatedSession(self, number, self.screens, session.screen, self.latency)
+        if number < len(self.sessions):
+            self.sessions[number] = new_session
+        else:
+            self.sessions.append(new_session)
+
+    def closesession(self, session_id):
+        self._session.count_call('CloseSession')
+        number = int(re.search(r'ses\[(\d+)\]', str(session_id)).group(1))
+        if number >= len(self.sessions) or self.sessions[number] is None:
+            raise SimulatorError("The control could not be found by id.")
+        # numbers of the other sessions do not change
+        self.sessions[number] = None
+
+    def closeconnection(self):
+        self._session.count_call('CloseConnection')
+        self.sessions.clear()
+
+    @property
+    def parent(self):
+        return self.application
+
+    def findbyid(self, element_id, raise_error=True):
+        return self.application.findbyid(element_id, raise_error)
+
+
+class SimulatedApplication:
+    """
+    The SimulatedApplication class replaces the SAP GUI scripting engine with one connection.
+
+    Methods:
+    --------
+    session(self, number=0) -> SimulatedSession:
+        Returns a session of the connection.
+
+    calls(self) -> collections.Counter:
+        Returns the GUI calls of all sessions per method or property.
+    """
+    def __init__(self, screens, start_screen, latency=0.0, system_name='ACE'):
+        self.connection = SimulatedConnection(self, 0, screens, start_screen, latency, system_name)
+
+    def session(self, number=0):
+        return self.connection.sessions[number]
+
+    def calls(self):
+        calls = collections.Counter()
+        for session in self.connection.sessions:
+            if session is not None:
+                calls.update(session.calls)
+        return calls
+
+    @property
+    def Children(self):
+        return GuiCollection(self.session(0), [self.connection])
+
+    def findbyid(self, element_id, raise_error=True):
+        match = re.match(r'^/app/con\[(\d+)\](?:/ses\[(\d+)\](?:/(.*))?)?$', str(element_id))
+        if match is None or int(match.group(1)) != 0:
+            if raise_error:
+                raise SimulatorError("The control could not be found by id.")
+            return None
+        if match.group(2) is None:
+            return self.connection
+        number = int(match.group(2))
+        session = self.connection.sessions[number] if number < len(self.connection.sessions) else None
+        if session is None or match.group(3) is None:
+            if session is None and raise_error:
+                raise SimulatorError("The control could not be found by id.")
+            return session
+        return session.findbyid(match.group(3), raise_error)
+
+    findById = findbyid
+
+
+def load_screens(*paths):
+    """
+    This function is used to read screen definitions from JSON fixture files.
+
+    Each file holds a dict of screens by name. A screen has a title, transaction, screen_number, status_bar and
+    elements by ID relative to the session (type field, table or grid) and transitions from
+    "<element id>|<action>[:<argument>]" to the name of the next screen or "back".
+
+    Parameters:
+    paths (str): Fixture files or directories with fixture files.
+
+    Returns:
+    dict: Screens by name.
+    """
+    screens = {}
+    for path in paths:
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.json')] if os.path.isdir(path) else [path]
+        for file_path in files:
+            with open(file_path, 'r', encoding='utf-8') as fixture_file:
+                screens.update(json.load(fixture_file))
+    return screens
+
+
+def simulate(*paths, start_screen='cockpit_list', latency=0.0, system_name='ACE'):
+    """
+    This function is used to build a simulated SAP GUI from fixture files.
+
+    Parameters:
+    paths (str): Fixture files or directories, see load_screens.
+    optional: start_screen (str): The screen the first session shows.
+    optional: latency (float): Seconds every GUI call takes.
+    optional: system_name (str): The SAP system name reported by session.info.
+
+    Returns:
+    SimulatedApplication: The scripting engine, session(0) is the logged on session.
+    """
+    return SimulatedApplication(load_screens(*paths), start_screen, latency, system_name)
@@ -0,0 +1,378 @@
+import os
+import sys
+import pytest
+from pathlib import Path
+
+abspath = os.path.dirname(os.path.abspath(__file__))
+main_path = Path(abspath).parent
+sys.path.insert(0, str(main_path))
+
+from sap_simulator import simulate, SimulatorError
+
+fixtures = os.path.join(abspath, 'fixtures')
+grid_id = "wnd[0]/usr/cntlTOP_CONTAINER/shellcont/shell"
+po_number_id = "wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0380/subSUB_HDR:/COCKPIT/SAPLDISPLAY46:0405/tabsG_STRIP_HDR/tabpTAB1/ssubSUB:/COCKPIT/SAPLDISPLAY46:0401/ctxt/COCKPIT/SHDR_DISP-PO_NUMBER"
+po_items_id = "wnd[0]/usr/subSUB0:SAPLMEGUI:0013/subSUB2:SAPLMEVIEWS:1100/subSUB2:SAPLMEVIEWS:1200/subSUB1:SAPLMEGUI:1211/tblSAPLMEGUITC_1211"
+
+
+@pytest.fixture
+def session():
+    return simulate(fixtures).session(0)
+
+
+def open_po(session):
+    session.findById(grid_id).selectedRows = "0"
+    session.findById("wnd[0]/tbar[1]/btn[8]").press()
+    session.findById(po_number_id).SetFocus()
+    session.findById("wnd[0]").sendVKey(2)
+
+
+def test_cockpit_grid(session):
+    grid = session.findById(grid_id)
+    assert grid.RowCount == 5
+    assert grid.getCellValue(2, "DOCNO") == "4713"
+    assert grid.getCellValue(2, "COMP_CODE") == "V436"
+    assert session.info.Transaction == "/COCKPIT/1"
+
+
+def test_find_by_id_flag(session):
+    assert session.findById("wnd[0]/usr/txtMISSING", False) is None
+    with pytest.raises(SimulatorError) as exc_info:
+        session.findById("wnd[0]/usr/txtMISSING")
+    assert exc_info.value.args[0] == "The control could not be found by id."
+
+
+def test_navigation(session):
+    open_po(session)
+    assert session.ActiveWindow.Text.startswith("Standard PO")
+    assert session.findById("wnd[0]/usr").Children.ElementAt(0).Id == "/app/con[0]/ses[0]/wnd[0]/usr/subSUB0:SAPLMEGUI:0013"
+    session.findById("wnd[0]").sendVKey(3)
+    assert session.findById(po_number_id).text == "4500012345"
+
+
+def test_table_control_scrolling(session):
+    open_po(session)
+    table = session.findById(po_items_id)
+    assert (table.RowCount, table.VisibleRowCount, table.verticalScrollbar.Maximum) == (12, 5, 7)
+    table.verticalScrollbar.position = 5
+    table = session.findById(po_items_id)
+    assert table.GetCell(0, 1).Text == "60"
+    assert session.findById(f"{po_items_id}/txtMEPO1211-NETPR[10,4]").text == "1000,00"
+    assert session.findById(f"{po_items_id}/txtMEPO1211-EBELP[1,5]", False) is None
+
+
+def test_status_bar_and_transaction(session):
+    session.findById("wnd[0]/tbar[0]/okcd").text = "/nXYZ"
+    session.findById("wnd[0]").sendVKey(0)
+    assert session.findById("wnd[0]/sbar").messagetype == "E"
+    session.findById("wnd[0]/tbar[0]/okcd").text = "/nBP"
+    session.findById("wnd[0]").sendVKey(0)
+    assert session.info.Transaction == "BP"
+
+
+def test_sessions(session):
+    connection = session.Parent
+    session.createSession()
+    assert connection.Children.count == 2
+    new_session = connection.Children(1)
+    assert new_session.Id == "/app/con[0]/ses[1]"
+    assert connection.Parent.findById(new_session.Id) is new_session
+    connection.CloseSession(new_session.Id)
+    assert connection.Children.count == 1
+
+
+def test_call_counts(session):
+    open_po(session)
+    assert session.calls["findById"] == 4
+    assert session.calls["sendVKey"] == 1
+
+
+@pytest.fixture
+def sap(session):
+    # needs the SAP library of the robot, the GUI is the simulated session
+    process_sap = pytest.importorskip("process_sap")
+    return process_sap.SapProcess.offline(session, main_path)
+
+
+def test_read_table_rows(sap, session):
+    open_po(session)
+    rows = sap.read_table_rows(po_items_id, {'item': 1, 'net_price': 10}, 'item')
+    assert [row['item'] for row in rows] == [str(10 * (n + 1)) for n in range(12)]
+
+
+def test_locate_document_and_screen_id(sap, session):
+    assert sap.locate_document(4713, 'V436') == 2
+    session.findById("wnd[0]/tbar[1]/btn[8]").press()
+    assert sap.find_screen_id(type=6, tab=1) == 380
+    assert sap.find_screen_id() == 380
+
+
+def test_new_session_reuses_closed_number(sap, session):
+    connection = session.Parent
+    session.createSession()
+    session.createSession()
+    connection.CloseSession("/app/con[0]/ses[1]")
+    new_session = sap.new_session()
+    # the last session of the connection is ses[2], the new one took the number of the closed one
+    assert new_session.Id == "/app/con[0]/ses[1]"
+    assert sap.session_ids[1] == "/app/con[0]/ses[1]"
+    assert connection.Children.count == 3
+    assert sap.close_additional_session(new_session)
+    assert [child.Id for child in sap.connection_sessions(connection)] == ["/app/con[0]/ses[0]", "/app/con[0]/ses[2]"]
+
+
+def test_worker_does_not_kill_sap(sap, session):
+    worker = sap.create_worker(session.Id)
+    worker.kill_sap()
+    assert worker.session_lost
+    assert not sap.worker and not sap.session_lost
+
+
+
+def test_workers_by_po(sap, session):
+    import pandas as pd
+    sap.update_po_snapshot('4500000001', {'vendor': '100'})
+    worker = sap.create_worker(session.Id)
+    assert worker.get_po_snapshot('4500000001') == {}
+    assert worker.po_cache is not sap.po_cache
+
+    df = pd.DataFrame({'Document Number': [1, 2, 3, 4], 'Purchasing Document': ['4500000001', '4500000002', '4500000001', None]})
+    assert sap.po_groups(df, [0, 1, 2, 3]) == [[0, 2], [1], [3]]
+    # without the PO column the documents are not split
+    assert sap.po_groups(df.drop(columns='Purchasing Document'), [0, 1, 2, 3]) == [[0, 1, 2, 3]]
+
+
+def test_screen_discovery_miss(sap, session):
+    session.findById(grid_id).selectedRows = "0"
+    session.findById("wnd[0]/tbar[1]/btn[8]").press()
+    sap.screen_discovery = True
+    # a container the discovery does not know
+    sap.discover_screen_ids = lambda session_nr=0: {'cockpit': [], 'megui': [], 'bp': []}
+    assert sap.find_screen_id() == 380
+    assert sap.screen_id_stats()['discovery_misses'] == 1
+
+
+def test_meta_data_index(sap, session):
+    import pandas as pd
+    from journal import document_key
+    grid = session.findById(grid_id)
+    # cockpit export with the layout texts of the columns, in another order than the cockpit list
+    headers = {'Workflow Status': 'WC_ICON', 'Company Code': 'COMP_CODE', 'Document Number': 'DOCNO',
+               'Follow-Up': 'FOLLOW_UP_ICON', 'FI/MM': 'FI_MM_FLG', 'Workflow Description': 'WC_NAME'}
+    df = pd.DataFrame([{header: grid.getCellValue(row, column) for header, column in headers.items()} for row in range(grid.RowCount)])
+    meta_data_index = sap.build_meta_data_index(df)
+    for row in range(grid.RowCount):
+        sap.current_row = row
+        doc_number = grid.getCellValue(row, 'DOCNO')
+        assert meta_data_index[document_key(doc_number, grid.getCellValue(row, 'COMP_CODE'))] == sap.get_meta_data(doc_number)
+    # no column is taken by its position
+    assert sap.build_meta_data_index(df.drop(columns='Document Number')) == {}
+
+def test_step_gui_calls(sap, session):
+    sap.enable_gui_stats()
+    calls = sum(session.calls.values())
+    assert sap.run_step('locate_document', sap.locate_document, 4713, 'V436') == 2
+    row = sap.step_timer.rows[-1]
+    # the grid is read through findById of the session, not find_element
+    assert row['element_lookups'] == 0
+    assert row['gui_calls'] == sum(session.calls.values()) - calls
+    assert sap.step_timer.summary()['locate_document']['gui_calls'] == row['gui_calls']
+
+
+def test_benchmark_corpus():
+    benchmark = pytest.importorskip("benchmark")
+    screens, work_list = benchmark.generate_corpus(documents=10, seed=3, error_rate=0.0)
+    assert screens["cockpit_list"]["elements"][grid_id]["rows"][0]["DOCNO"] == work_list[0][0]
+    result = benchmark.run_benchmark(screens, work_list)
+    assert sum(result['outcomes'].values()) == 10
+    assert result['gui_calls_per_doc'] > 0
+    # the documents get past the PO data to the PO line checks
+    assert 'check_process_data' in result['p95']
+    assert result['errors'] < 10
+
+
+def test_gui_trace_replay(sap, session, tmp_path):
+    from gui_trace import GuiReplay
+    sap.enable_gui_trace()
+    assert sap.locate_document(4713, 'V436') == 2
+    trace_path = str(tmp_path / 'trace.jsonl.gz')
+    sap.save_gui_trace(trace_path)
+
+    replay = GuiReplay(trace_path)
+    replayed = type(sap).offline(replay.session(), main_path)
+    assert replayed.locate_document(4713, 'V436') == 2
+    assert replay.misses == {}
+    assert sum(replay.served.values()) == sum(1 for line in sap.gui_trace.lines if line[0] not in ('p', 'm'))
+
+
+def test_gui_trace_written_while_recorded(sap, tmp_path):
+    from gui_trace import GuiReplay
+    trace_path = str(tmp_path / 'trace.jsonl.gz')
+    sap.enable_gui_trace(trace_path)
+    assert sap.locate_document(4713, 'V436') == 2
+    # nothing is kept in memory
+    assert sap.gui_trace.lines == [] and sap.gui_trace.count > 0
+    sap.save_gui_trace()
+
+    replay = GuiReplay(trace_path)
+    replayed = type(sap).offline(replay.session(), main_path)
+    assert replayed.locate_document(4713, 'V436') == 2
+    assert replay.misses == {}
+
+
+def test_replay_run_meta_data(tmp_path):
+    benchmark = pytest.importorskip("benchmark")
+    from gui_trace import GuiReplay, replay_run
+    from sap_simulator import SimulatedApplication
+    screens, work_list = benchmark.generate_corpus(documents=1, seed=3, error_rate=0.0)
+    sap = benchmark.SapProcess.offline(SimulatedApplication(screens, 'cockpit_list').session(0), main_path)
+    doc_number, company_code = work_list[0]
+    # read before the trace starts, as main.py takes it from the index of the cockpit export
+    metaData = sap.get_meta_data(doc_number)
+    sap.enable_gui_trace()
+    sap.process_item(doc_number, company_code, metaData)
+    trace_path = str(tmp_path / 'trace.jsonl.gz')
+    sap.save_gui_trace(trace_path)
+
+    assert GuiReplay(trace_path).markers[0][1]['metaData'] == metaData
+    result = replay_run(trace_path, main_path)
+    # the replay does not read the metadata from the cockpit list
+    assert result['misses'] == {}
+    assert result['documents'] == 1
+
+
+def test_wait_for_file(sap, tmp_path):
+    import threading
+    import time
+    export_file = tmp_path / 'Export.xlsx'
+
+    def write():
+        with open(export_file, 'wb') as file:
+            for _ in range(3):
+                file.write(b'x' * 1000)
+                file.flush()
+                time.sleep(0.1)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert sap.wait_for_file(str(export_file), timeout=5, settle=0.2)
+    assert export_file.stat().st_size == 3000
+    writer.join()
+    assert not sap.wait_for_file(str(tmp_path / 'missing.xlsx'), timeout=0.2)
+
+
+def test_run_journal(tmp_path):
+    # logs with the robot library
+    journal_module = pytest.importorskip("journal")
+    RunJournal, list_checksum = journal_module.RunJournal, journal_module.list_checksum
+    checksum = list_checksum([('4713', 'V436'), ('4712', '3B5')])
+    assert checksum == list_checksum([('4712', '3B5'), ('4713', 'V436')])
+    journal = RunJournal(str(tmp_path / 'FR_runJournal.jsonl'))
+    journal.start('2021-05-03', checksum)
+    journal.record(4713.0, 'v436', 'Posted', '5105600001')
+    journal = RunJournal(journal.path)
+    journal.load()
+    assert journal.get('0004713', 'V436')['posting_number'] == '5105600001'
+    assert journal.matches('2021-05-03', checksum)
+    assert not journal.matches('2021-05-04', checksum)
+    assert not journal.matches('2021-05-03', list_checksum([('4713', 'V436')]))
+
+
+def test_text_export(sap, tmp_path):
+    import datetime
+    export_file = tmp_path / 'Export.txt'
+    lines = ["", "\tDocument Number\tCompany Code\tCreation date\tGross Amount\tVendor\t",
+             "\t5100000001\t3B5\t02.05.2021\t1.234,50\t0000100001\t",
+             "\t5100000002\tV436\t03.05.2021\t20,00-\t0000100002\t"]
+    export_file.write_bytes("\r\n".join(lines).encode('utf-16'))
+    df = sap.excel.read_export(str(export_file))
+    assert list(df.columns) == ['Document Number', 'Company Code', 'Creation date', 'Gross Amount', 'Vendor']
+    assert df['Document Number'].tolist() == [5100000001, 5100000002]
+    assert df['Gross Amount'].tolist() == [1234.5, -20.0]
+    assert df['Vendor'].tolist() == ['0000100001', '0000100002']
+    assert str(df['Creation date'].dtype).startswith('datetime64')
+    assert sap.filter_dates(df, [datetime.datetime(2021, 5, 3, 14, 0)])['Document Number'].tolist() == [5100000002]
+    assert sap.filter_dates(df, [datetime.date(2021, 5, 1), datetime.date(2021, 5, 2)])['Document Number'].tolist() == [5100000002]
+
+
+def test_find_element_cache(sap, session):
+    open_po(session)
+    session.findById("wnd[0]").sendVKey(3)
+    saldo_id = "wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0380/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO"
+    session.calls.clear()
+    for _ in range(5):
+        session.findById(saldo_id).text
+    uncached = sum(session.calls.values())
+
+    session.calls.clear()
+    for _ in range(5):
+        sap.find_element(saldo_id).text
+    assert sum(session.calls.values()) == uncached - 4
+    assert session.calls["findById"] == 1
+
+    # a key sent to the window can lead to another screen, the handle is resolved again
+    sap.gui_session.findById("wnd[0]").sendVKey(0)
+    sap.find_element(saldo_id).text
+    assert session.calls["findById"] == 3
+
+
+def item_table_screen(lines):
+    # cockpit document with the item table in the column layout check_po_lines reads
+    columns = ["", "txt/COCKPIT/SITEM_DISP-INVOICE_ITEM", "ctxt/COCKPIT/SITEM_DISP-PO_NUMBER", "ctxt/COCKPIT/SITEM_DISP-PO_ITEM",
+               "txt/COCKPIT/SITEM_DISP-ITEM_AMOUNT", "", "", "", "", "", "ctxt/COCKPIT/SITEM_DISP-TAX_CODE"]
+    table_id = "wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0380/subSUB_ITEM:/COCKPIT/SAPLDISPLAY46:0410/tbl/COCKPIT/SAPLDISPLAY46G_TC_ITEM_DET"
+    saldo_id = "wnd[0]/usr/subSUB_MAIN:/COCKPIT/SAPLDISPLAY46:0380/subSUB_SALDO:/COCKPIT/SAPLDISPLAY46:0440/txt/COCKPIT/SDUMMY-SALDO"
+    return {"items": {"title": "Display document", "transaction": "/COCKPIT/1", "screen_number": 380,
+                      "elements": {table_id: {"type": "table", "visible_rows": 7, "columns": columns, "rows": lines},
+                                   saldo_id: {"text": "0,00"}}}}
+
+
+def check_po_line_entry_data(**values):
+    entry_data = {'how_many_lines': 0, 'value': 0.00, 'different_pos': False, 'multiple_pos_exist': False, 'rule_5': False,
+                  'searched_amount': 0.0, 'crop_result': False, 'multiple_only': False, 'sum_po_lines': 0.0, 'saldo': 0.0,
+                  'tax_code_missing': False, 'missing_tax_codes': ""}
+    entry_data.update(values)
+    return entry_data
+
+
+def test_check_po_lines_same_line_on_next_page():
+    process_sap = pytest.importorskip("process_sap")
+    from sap_simulator import SimulatedApplication
+    # the first lines of the second and third page of 7 lines belong to the same invoice item
+    invoice_items = [str(n + 1) for n in range(14)] + ["8"]
+    lines = [["", item, "4500012345", "10", f"{n + 1},00", "", "", "", "", "", "V1"] for n, item in enumerate(invoice_items)]
+    session = SimulatedApplication(item_table_screen(lines), 'items').session(0)
+    sap = process_sap.SapProcess.offline(session, main_path)
+
+    result, entry_data = sap.check_po_lines(check_po_line_entry_data())
+    assert result is True
+    assert entry_data['sum_po_lines'] == 15.0
+    assert entry_data['how_many_lines'] == 14
+
+    result, entry_data = sap.check_po_lines(check_po_line_entry_data(different_pos=True))
+    assert (result, entry_data['how_many_lines'], entry_data['sum_po_lines'], entry_data['value']) == (True, 14, 15.0, 0.0)
+
+
+def test_get_po_line_details():
+    process_sap = pytest.importorskip("process_sap")
+    from sap_simulator import SimulatedApplication, load_screens
+    screens = load_screens(fixtures)
+    session = SimulatedApplication(screens, 'me23n_po').session(0)
+    more_than_one_line, po_lines = process_sap.SapProcess.offline(session, main_path).get_po_line_details(4713, 13)
+    assert more_than_one_line is True
+    assert [line['item'] for line in po_lines] == [str(10 * (n + 1)) for n in range(12)]
+    assert po_lines[9]['net_price'] == "1000,00"
+
+    # a PO without lines gives the empty first row, as the cell by cell read did
+    screens['me23n_po']['elements'][po_items_id]['rows'] = []
+    session = SimulatedApplication(screens, 'me23n_po').session(0)
+    more_than_one_line, po_lines = process_sap.SapProcess.offline(session, main_path).get_po_line_details(4713, 13)
+    assert more_than_one_line is False
+    assert po_lines == [{'item': '', 'qty': '', 'net_price': '', 'order_unit': '', 'price_unit': ''}]
+
+
+def test_is_wf_status_supported(sap):
+    assert sap.is_wf_status_supported({'WFstatus': ' Approved '}, ['approved']) is False
+    assert sap.is_wf_status_supported({'WFstatus': 'Not Approved'}, ['Approved']) is True
+    assert sap.is_wf_status_supported({'WFstatus': ''}, ['Approved']) is True
+    assert sap.is_wf_status_supported({'WFstatus': 'Approved'}) is True